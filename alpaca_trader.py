@@ -1,52 +1,80 @@
-import alpaca_trade_api as tradeapi
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime, time
-import pytz
+import market_calendar
+from rate_limiter import get_limiter
+from metrics import InstrumentedClient
 
 # Load environment variables
 load_dotenv()
 
+def alpaca_base_url():
+    """
+    Get the Alpaca API URL from ALPACA_BASE_URL, or the older ENDPOINT setting.
+
+    Paper trading is the default. A trailing /v2 is dropped because the SDK
+    adds the API version itself.
+    """
+    url = os.getenv('ALPACA_BASE_URL') or os.getenv('ENDPOINT') or 'https://paper-api.alpaca.markets'
+    url = url.rstrip('/')
+    return url[:-len('/v2')] if url.endswith('/v2') else url
+
+# Seconds before an Alpaca HTTP request is abandoned
+ALPACA_REQUEST_TIMEOUT = float(os.getenv('ALPACA_REQUEST_TIMEOUT', 10))
+
+def with_request_timeout(rest, timeout=None):
+    """
+    Give every HTTP request of an Alpaca REST client a timeout.
+
+    The SDK sends its requests without one, so a stalled connection would
+    otherwise hang the calling thread indefinitely.
+    """
+    session = getattr(rest, '_session', None)
+    if session is None:
+        return rest
+    request = session.request
+
+    def request_with_timeout(method, url, **kwargs):
+        kwargs.setdefault('timeout', timeout or ALPACA_REQUEST_TIMEOUT)
+        return request(method, url, **kwargs)
+
+    session.request = request_with_timeout
+    return rest
+
 class AlpacaTrader:
-    def __init__(self):
+    def __init__(self, api_key=None, api_secret=None, base_url=None):
+        # Credentials default to the environment (the app-wide account)
+        self.api_key = api_key or os.getenv('ALPACA_API_KEY')
+        self.api_secret = api_secret or os.getenv('ALPACA_SECRET_KEY')
+        self.base_url = base_url or alpaca_base_url()
         self.api = None
         self.connected = False
         self.setup_logging()
-        self.sydney_tz = pytz.timezone('Australia/Sydney')
+        self.limiter = get_limiter('alpaca')
 
     def setup_logging(self):
+        # Handlers live on the root logger (see logging_setup); adding one per
+        # instance would write every message once per AlpacaTrader created
         self.logger = logging.getLogger('alpaca_trader')
-        self.logger.setLevel(logging.INFO)
-        handler = logging.FileHandler('alpaca_trader.log')
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
 
     def is_asx_market_open(self):
         """Check if ASX market is currently open"""
-        now = datetime.now(self.sydney_tz)
-        market_open = time(10, 0)  # 10:00 AM Sydney time
-        market_close = time(16, 0)  # 4:00 PM Sydney time
-        
-        # Check if it's a weekday
-        if now.weekday() >= 5:  # 5 is Saturday, 6 is Sunday
-            return False
-            
-        current_time = now.time()
-        return market_open <= current_time <= market_close
+        return market_calendar.is_open('asx')
 
     def connect(self):
         try:
+            # Imported here: the Alpaca SDK pulls in pandas and aiohttp
+            import alpaca_trade_api as tradeapi
             # Initialize Alpaca API
-            self.api = tradeapi.REST(
-                key_id=os.getenv('ALPACA_API_KEY'),
-                secret_key=os.getenv('ALPACA_SECRET_KEY'),
-                base_url=os.getenv('ALPACA_BASE_URL', 'https://paper-api.alpaca.markets'),  # Use paper trading by default
+            self.api = InstrumentedClient(with_request_timeout(tradeapi.REST(
+                key_id=self.api_key,
+                secret_key=self.api_secret,
+                base_url=self.base_url,
                 api_version='v2'
-            )
+            )), 'alpaca')
             
             # Test connection by getting account info
+            self.limiter.acquire()
             account = self.api.get_account()
             self.connected = True
             self.logger.info(f"Successfully connected to Alpaca. Account status: {account.status}")
@@ -55,7 +83,7 @@ class AlpacaTrader:
             self.logger.error(f"Connection error: {str(e)}")
             return False
 
-    def place_order(self, symbol, quantity, order_type='market', limit_price=None):
+    def place_order(self, symbol, quantity, order_type='market', limit_price=None, client_order_id=None):
         if not self.connected:
             self.logger.error("Not connected to Alpaca")
             return False
@@ -65,21 +93,22 @@ class AlpacaTrader:
             return False
 
         try:
-            # Add .AX suffix for ASX stocks
-            symbol = f"{symbol}.AX"
-            
+            # Symbols are passed through as they are: bare symbols are US tickers
+            # (ASX symbols carry the Yahoo .AX suffix and aren't listed on Alpaca)
             # Determine if this is a buy or sell order
             side = 'buy' if quantity > 0 else 'sell'
             quantity = abs(quantity)  # Convert to positive number
             
             # Create order
+            self.limiter.acquire()
             if order_type == 'market':
                 order = self.api.submit_order(
                     symbol=symbol,
                     qty=quantity,
                     side=side,
                     type='market',
-                    time_in_force='day'
+                    time_in_force='day',
+                    client_order_id=client_order_id
                 )
             elif order_type == 'limit' and limit_price is not None:
                 order = self.api.submit_order(
@@ -88,7 +117,8 @@ class AlpacaTrader:
                     side=side,
                     type='limit',
                     time_in_force='day',
-                    limit_price=limit_price
+                    limit_price=limit_price,
+                    client_order_id=client_order_id
                 )
             else:
                 self.logger.error(f"Invalid order type or missing limit price: {order_type}")
@@ -97,15 +127,29 @@ class AlpacaTrader:
             self.logger.info(f"Order placed successfully: {side} {quantity} {symbol}")
             return True
         except Exception as e:
+            if client_order_id and self.order_exists(client_order_id):
+                # A previous attempt already reached the broker
+                self.logger.info(f"Order {client_order_id} was already accepted")
+                return True
             self.logger.error(f"Order placement error: {str(e)}")
             return False
 
+    def order_exists(self, client_order_id):
+        """Check whether an order with this client order ID has been accepted"""
+        try:
+            self.limiter.acquire()
+            self.api.get_order_by_client_order_id(client_order_id)
+            return True
+        except Exception:
+            return False
+
     def get_portfolio_value(self):
         if not self.connected:
             self.logger.error("Not connected to Alpaca")
             return 0.0
 
         try:
+            self.limiter.acquire()
             account = self.api.get_account()
             return float(account.equity)
         except Exception as e:
@@ -126,6 +170,18 @@ class AlpacaTrader:
             self.logger.error(f"Error getting price for {symbol}: {str(e)}")
             return None
 
+    def health_check(self):
+        """Check that the connection still works"""
+        if not self.connected:
+            return False
+        try:
+            self.limiter.acquire()
+            self.api.get_account()
+            return True
+        except Exception as e:
+            self.logger.warning(f"Health check failed: {str(e)}")
+            return False
+
     def disconnect(self):
         if self.connected:
             self.connected = False
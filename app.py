@@ -1,186 +1,163 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 import logging
 import os
+from logging_setup import configure_logging
 from trading_engine import TradingEngine
 from alpaca_trader import AlpacaTrader
-from price_utils import get_stock_price, get_asx_stocks
+from price_utils import get_stock_price, get_stock_prices, quote_cache, quote_ttl, fundamentals_cache
+from rate_limiter import limiter_stats
+from price_refresher import PriceRefresher
+from history_store import history_store
+from portfolio_analytics import PortfolioAnalytics
+from db_config import engine_options, pool_metrics
+from metrics import registry as metrics_registry, request_latency
+from request_profiler import request_profiler
+from order_dispatch import OrderDispatcher, FAILED
+from broker_pool import BrokerClientPool, LazyClient, credentials_key
+from price_hub import PriceHub, PollingPriceFeed
+from quote_providers import AlpacaProvider, CircuitBreaker, HedgedQuoteFetcher, YahooProvider
+import market_calendar
+from symbol_universe import symbol_universe
 from datetime import datetime, timedelta
 import pytz
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import json
+import hashlib
+import hmac
+import threading
+import uuid
 import time
-import yfinance as yf
 
 # Load environment variables
 load_dotenv()
-print("APCA_API_KEY_ID:", os.getenv("APCA_API_KEY_ID"))
-
-# Setup logging to a file
-logging.basicConfig(
-    filename=os.getenv('LOG_FILE', 'click_trader_log.txt'),
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+
+# Log through a background writer thread (LOG_FILE, LOG_FORMAT, LOG_LEVEL)
+configure_logging()
 
 def is_market_open(market='asx'):
     """
     Check if the specified market is currently open.
     """
-    if market == 'asx':
-        # Get current time in Sydney timezone
-        sydney_tz = pytz.timezone('Australia/Sydney')
-        current_time = datetime.now(sydney_tz)
-        
-        # Check if it's a weekday
-        if current_time.weekday() >= 5:  # 5 is Saturday, 6 is Sunday
-            return False
-        
-        # ASX trading hours: 10:00 AM - 4:00 PM Sydney time
-        market_open = current_time.replace(hour=10, minute=0, second=0, microsecond=0)
-        market_close = current_time.replace(hour=16, minute=0, second=0, microsecond=0)
-        
-        return market_open <= current_time <= market_close
-    
-    elif market in ['nyse', 'nasdaq']:
-        # Get current time in New York timezone
-        ny_tz = pytz.timezone('America/New_York')
-        current_time = datetime.now(ny_tz)
-        
-        # Check if it's a weekday
-        if current_time.weekday() >= 5:  # 5 is Saturday, 6 is Sunday
-            return False
-        
-        # NYSE/NASDAQ trading hours: 9:30 AM - 4:00 PM Eastern Time
-        market_open = current_time.replace(hour=9, minute=30, second=0, microsecond=0)
-        market_close = current_time.replace(hour=16, minute=0, second=0, microsecond=0)
-        
-        return market_open <= current_time <= market_close
-    
-    return False
+    return market_calendar.is_open(market)
+
+market_status_cache = market_calendar.SessionCache()
 
 def get_market_status(market='asx', user_timezone='Australia/Sydney'):
     """
     Get the current status and trading hours for the specified market.
+
+    Statuses are memoized per market and user timezone until the market next
+    opens or closes, so the returned dict is shared and must not be modified.
     """
+    if market_calendar.get_calendar(market) is None:
+        return None
+    return market_status_cache.get_or_build(
+        market, (user_timezone,),
+        lambda: _build_market_status(market, user_timezone)
+    )
+
+def _build_market_status(market, user_timezone):
     try:
         user_tz = pytz.timezone(user_timezone)
     except pytz.exceptions.UnknownTimeZoneError:
         user_tz = pytz.timezone('Australia/Sydney')  # Fallback to Sydney timezone
 
-    if market == 'asx':
-        market_tz = pytz.timezone('Australia/Sydney')
-        market_open = market_tz.localize(datetime.now().replace(hour=10, minute=0, second=0, microsecond=0))
-        market_close = market_tz.localize(datetime.now().replace(hour=16, minute=0, second=0, microsecond=0))
-        
-        # Convert to user's timezone
-        market_open_user = market_open.astimezone(user_tz)
-        market_close_user = market_close.astimezone(user_tz)
-        
-        return {
-            'name': 'ASX',
-            'is_open': is_market_open('asx'),
-            'trading_hours': f"{market_open_user.strftime('%I:%M %p')} - {market_close_user.strftime('%I:%M %p')} {user_tz.zone}",
-            'timezone': user_timezone
-        }
-    elif market in ['nyse', 'nasdaq']:
-        market_tz = pytz.timezone('America/New_York')
-        market_open = market_tz.localize(datetime.now().replace(hour=9, minute=30, second=0, microsecond=0))
-        market_close = market_tz.localize(datetime.now().replace(hour=16, minute=0, second=0, microsecond=0))
-        
-        # Convert to user's timezone
-        market_open_user = market_open.astimezone(user_tz)
-        market_close_user = market_close.astimezone(user_tz)
-        
-        return {
-            'name': 'NYSE' if market == 'nyse' else 'NASDAQ',
-            'is_open': is_market_open(market),
-            'trading_hours': f"{market_open_user.strftime('%I:%M %p')} - {market_close_user.strftime('%I:%M %p')} {user_tz.zone}",
-            'timezone': user_timezone
-        }
-    return None
+    calendar = market_calendar.get_calendar(market)
+    # Show today's session in market time (early closes included), or the
+    # regular hours when the market doesn't trade today
+    today = datetime.now(calendar.tz).date()
+    market_open, market_close = calendar.session(today) or calendar.regular_hours(today)
+
+    # Convert to user's timezone
+    market_open_user = market_open.astimezone(user_tz)
+    market_close_user = market_close.astimezone(user_tz)
+    next_open = calendar.next_open()
+    next_close = calendar.next_close()
+
+    return {
+        'name': calendar.name,
+        'is_open': calendar.is_open(),
+        'trading_hours': f"{market_open_user.strftime('%I:%M %p')} - {market_close_user.strftime('%I:%M %p')} {user_tz.zone}",
+        'timezone': user_timezone,
+        'next_open': next_open.astimezone(user_tz) if next_open else None,
+        'next_close': next_close.astimezone(user_tz) if next_close else None
+    }
 
 def get_stocks_for_market(market='asx'):
     """
     Get list of stocks for the specified market.
     """
-    if market == 'asx':
-        return get_asx_stocks()
-    elif market in ['nyse', 'nasdaq']:
-        # For NYSE and NASDAQ, we'll use a predefined list of major stocks
-        # In a production environment, you would want to fetch this from an API
-        if market == 'nyse':
-            return [
-                {'symbol': 'AAPL', 'name': 'Apple Inc.'},
-                {'symbol': 'MSFT', 'name': 'Microsoft Corporation'},
-                {'symbol': 'JPM', 'name': 'JPMorgan Chase & Co.'},
-                {'symbol': 'V', 'name': 'Visa Inc.'},
-                {'symbol': 'WMT', 'name': 'Walmart Inc.'},
-                {'symbol': 'JNJ', 'name': 'Johnson & Johnson'},
-                {'symbol': 'PG', 'name': 'Procter & Gamble Co.'},
-                {'symbol': 'MA', 'name': 'Mastercard Inc.'},
-                {'symbol': 'HD', 'name': 'Home Depot Inc.'},
-                {'symbol': 'BAC', 'name': 'Bank of America Corp.'}
-            ]
-        else:  # nasdaq
-            return [
-                {'symbol': 'AAPL', 'name': 'Apple Inc.'},
-                {'symbol': 'MSFT', 'name': 'Microsoft Corporation'},
-                {'symbol': 'AMZN', 'name': 'Amazon.com Inc.'},
-                {'symbol': 'GOOGL', 'name': 'Alphabet Inc.'},
-                {'symbol': 'META', 'name': 'Meta Platforms Inc.'},
-                {'symbol': 'TSLA', 'name': 'Tesla Inc.'},
-                {'symbol': 'NVDA', 'name': 'NVIDIA Corporation'},
-                {'symbol': 'PYPL', 'name': 'PayPal Holdings Inc.'},
-                {'symbol': 'INTC', 'name': 'Intel Corporation'},
-                {'symbol': 'CMCSA', 'name': 'Comcast Corporation'}
-            ]
-    return []
+    return symbol_universe.listings(market)
 
 app = Flask(__name__)
 
 # Configure the app
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///click_trader.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', os.urandom(24))
 
 # Initialize extensions
 db = SQLAlchemy(app)
 
-# Initialize trading engines
-ib_engine = TradingEngine()
-alpaca_engine = AlpacaTrader()
+# Registered first so tables exist before any other hook (e.g. load_user) queries them
+@app.before_request
+def ensure_services_started():
+    start_services()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def observe_request_latency(exc):
+    """Record request latency under the route pattern, so /price/AAPL and /price/MSFT share a series."""
+    # Streamed responses tear down twice; only the first (headers sent) counts
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    request_latency.observe(time.perf_counter() - start, request.method, route, status)
+
+# Admin token for profiling; send it as X-Profile-Token to profile a request
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN')
+
+def has_profiler_token() -> bool:
+    token = request.headers.get('X-Profile-Token')
+    return bool(PROFILER_TOKEN and token and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode()))
+
+@app.before_request
+def start_profiling():
+    if request.path.startswith('/admin/profiles'):
+        return
+    if has_profiler_token() or request_profiler.should_sample():
+        g.profile_start = (time.perf_counter(), time.time())
+        request_profiler.start()
+
+@app.teardown_request
+def finish_profiling(exc):
+    started = g.pop('profile_start', None)
+    if started is None:
+        return
+    samples = request_profiler.stop()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    request_profiler.record(request.method, request.full_path.rstrip('?'), route, status, time.perf_counter() - started[0], started[1], samples)
 
 # Get the preferred trading platform from environment variable
 TRADING_PLATFORM = os.getenv('TRADING_PLATFORM', 'alpaca').lower()  # Default to Alpaca
 
-# Connect to the selected trading platform
-if TRADING_PLATFORM == 'ib':
-    try:
-        if ib_engine.connect():
-            logging.info("Successfully connected to Interactive Brokers")
-        else:
-            logging.error("Failed to connect to Interactive Brokers")
-    except Exception as e:
-        logging.error(f"Error connecting to Interactive Brokers: {str(e)}")
-elif TRADING_PLATFORM == 'alpaca':
-    try:
-        alpaca_engine = AlpacaTrader()
-        alpaca_engine.api_key = os.getenv('ALPACA_API_KEY')
-        alpaca_engine.api_secret = os.getenv('ALPACA_SECRET_KEY')
-        alpaca_engine.base_url = os.getenv('ENDPOINT', 'https://paper-api.alpaca.markets/v2')
-        if alpaca_engine.connect():
-            logging.info("Connected to Alpaca")
-            print("Successfully logged in to Alpaca!")  # Console message for successful login
-        else:
-            logging.error("Failed to connect to Alpaca")
-    except Exception as e:
-        logging.error(f"Error initializing Alpaca: {str(e)}")
-        alpaca_engine = None
-
 # User model
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -220,11 +197,28 @@ class UserPortfolio(db.Model):
     last_price = db.Column(db.Float)
     last_updated = db.Column(db.DateTime)
 
-# Create database and tables
-with app.app_context():
-    # Create tables if they don't exist
-    db.create_all()
-    logging.info("Database tables checked/created.")
+    __table_args__ = (
+        # Covers per-user lookups as well as (user_id, symbol) lot queries
+        db.Index('ix_user_portfolio_user_id_symbol', 'user_id', 'symbol'),
+        # Used by the price refresher's distinct-symbol scan and updates
+        db.Index('ix_user_portfolio_symbol', 'symbol'),
+    )
+
+# Order intents recorded by the web tier and submitted by the order dispatcher
+class OrderIntent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    client_order_id = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)  # Negative for sells
+    price = db.Column(db.Float)
+    platform = db.Column(db.String(10), nullable=False)
+    portfolio_id = db.Column(db.Integer)  # Lot being sold, for sell orders
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 # Login required decorator
 def login_required(f):
@@ -285,9 +279,15 @@ def index():
     market = user.primary_market if user else 'asx'
     
     if request.method == 'POST':
-        stock_symbol = request.form.get('stock_symbol')
+        # BHP typed on the ASX means BHP.AX
+        stock_symbol = symbol_universe.resolve(request.form.get('stock_symbol', ''), market)
         quantity = int(request.form.get('quantity', 0))
         
+        # The starter set is too small to reject symbols it doesn't list
+        if symbol_universe.is_complete() and symbol_universe.get(stock_symbol) is None:
+            flash(f'Unknown stock symbol: {stock_symbol}', 'error')
+            return redirect(url_for('index'))
+        
         if not is_market_open(market):
             flash(f'{get_market_status(market, user.timezone)["name"]} is currently closed. Trading is only available during market hours.', 'warning')
             return redirect(url_for('index'))
@@ -299,59 +299,67 @@ def index():
                 flash('Could not fetch current price. Please try again.', 'error')
                 return redirect(url_for('index'))
             
-            # Execute the trade through the selected platform
-            trade_success = False
-            if user.trading_platform == 'ib':
-                trade_success = ib_engine.place_order(stock_symbol, quantity)
-            else:  # alpaca
-                trade_success = alpaca_engine.place_order(stock_symbol, quantity)
-            
-            if trade_success:
-                # Add to portfolio database
-                portfolio = UserPortfolio(
-                    user_id=session['user_id'],
-                    symbol=stock_symbol.upper(),
-                    quantity=quantity,
-                    purchase_price=current_price
-                )
-                db.session.add(portfolio)
-                db.session.commit()
-                
-                flash(f'Successfully bought {quantity} shares of {stock_symbol} at ${current_price:.2f}!', 'success')
+            # Queue the trade; a worker submits it through the selected platform
+            intent, created = order_dispatcher.enqueue(
+                user_id=session['user_id'],
+                symbol=stock_symbol,
+                quantity=quantity,
+                price=current_price,
+                platform=user.trading_platform,
+                nonce=request.form.get('order_nonce') or uuid.uuid4().hex
+            )
+            if created:
+                flash(f'Order to buy {quantity} shares of {stock_symbol} at ${current_price:.2f} submitted.', 'success')
             else:
-                flash(f'Failed to execute trade through {user.trading_platform.upper()}.', 'error')
+                flash(f'This order was already submitted (status: {intent.status}).', 'info')
         except Exception as e:
             logging.error(f"Error executing trade: {str(e)}")
             flash('An error occurred while executing the trade.', 'error')
         
         return redirect(url_for('index'))
     
-    # Get user's portfolio
-    portfolios = UserPortfolio.query.filter_by(user_id=session['user_id']).all()
+    # Get user's portfolio, one row per symbol
+    positions, quotes, analytics = get_portfolio_analytics(session['user_id'])
+    expand = request.args.get('expand', '').upper()
     portfolio_data = []
-    for p in portfolios:
-        current_price = get_live_price(p.symbol)
-        last_closed_price = get_stock_price(p.symbol, use_last_closed=True)
-        price_change = None
-        if current_price and p.purchase_price:
-            price_change = ((current_price - p.purchase_price) / p.purchase_price) * 100
-        
+    for position, metrics in zip(positions, analytics.positions()):
+        quote = quotes[position.symbol.upper()]
+        lots = []
+        if position.lots > 1 and position.symbol.upper() == expand:
+            for lot in get_position_lots(session['user_id'], position.symbol):
+                lots.append({
+                    'id': lot.id,
+                    'quantity': lot.quantity,
+                    'purchase_price': lot.purchase_price,
+                    'price_change': ((quote['current_price'] - lot.purchase_price) / lot.purchase_price) * 100
+                        if quote['current_price'] and lot.purchase_price else None,
+                    'purchase_date': lot.purchase_date.strftime('%Y-%m-%d %H:%M:%S')
+                })
         portfolio_data.append({
-            'symbol': p.symbol,
-            'quantity': p.quantity,
-            'purchase_price': p.purchase_price,
-            'current_price': current_price,
-            'last_closed_price': last_closed_price,
-            'price_change': price_change,
-            'purchase_date': p.purchase_date.strftime('%Y-%m-%d %H:%M:%S')
+            'id': position.id,
+            'symbol': position.symbol,
+            'quantity': position.quantity,
+            'purchase_price': position.purchase_price,
+            'current_price': metrics['current_price'],
+            'last_closed_price': metrics['last_close'],
+            'price_change': metrics['price_change'],
+            'market_value': metrics['market_value'],
+            'weight': metrics['weight'],
+            'quote_status': quote['status'],
+            'purchase_date': position.purchase_date.strftime('%Y-%m-%d %H:%M:%S'),
+            'lot_count': position.lots,
+            'lots': lots
         })
     
     market_status = get_market_status(market, user.timezone)
     return render_template('index.html', 
                          portfolio=portfolio_data,
+                         summary=analytics.summary(),
                          market_status=market_status,
-                         stocks=get_stocks_for_market(market),
-                         trading_platform=user.trading_platform.upper())
+                         market=market,
+                         trading_platform=user.trading_platform.upper(),
+                         orders=OrderIntent.query.filter_by(user_id=user.id).order_by(OrderIntent.id.desc()).limit(10).all(),
+                         order_nonce=uuid.uuid4().hex)
 
 @app.route('/delete/<int:portfolio_id>', methods=['POST'])
 @login_required
@@ -362,25 +370,48 @@ def delete_stock(portfolio_id):
         return redirect(url_for('index'))
     
     try:
-        # Execute sell order through the selected platform
-        trade_success = False
-        if portfolio.user.trading_platform == 'ib':
-            trade_success = ib_engine.place_order(portfolio.symbol, -portfolio.quantity)
-        else:  # alpaca
-            trade_success = alpaca_engine.place_order(portfolio.symbol, -portfolio.quantity)
-        
-        if trade_success:
-            db.session.delete(portfolio)
-            db.session.commit()
-            flash(f'Successfully sold {portfolio.quantity} shares of {portfolio.symbol}!', 'success')
+        # Queue the sell order; selling a given lot is a single intent, so resubmits are
+        # ignored. Each failed attempt moves the lot to a new nonce so it can be sold again.
+        # Read the lot first: a fast worker may sell and delete it before enqueue returns
+        symbol, quantity = portfolio.symbol, portfolio.quantity
+        failed = OrderIntent.query.filter_by(portfolio_id=portfolio.id, status=FAILED).count()
+        nonce = f"sell-{portfolio.id}" if not failed else f"sell-{portfolio.id}-retry{failed}"
+        intent, created = order_dispatcher.enqueue(
+            user_id=session['user_id'],
+            symbol=portfolio.symbol,
+            quantity=-portfolio.quantity,
+            price=portfolio.last_price or portfolio.purchase_price,
+            platform=portfolio.user.trading_platform,
+            nonce=nonce,
+            portfolio_id=portfolio.id
+        )
+        if created:
+            flash(f'Order to sell {quantity} shares of {symbol} submitted.', 'success')
         else:
-            flash(f'Failed to execute sell order through {portfolio.user.trading_platform.upper()}.', 'error')
+            flash(f'A sell order for this holding was already submitted (status: {intent.status}).', 'info')
     except Exception as e:
         logging.error(f"Error executing sell order: {str(e)}")
         flash('An error occurred while selling the stock.', 'error')
     
     return redirect(url_for('index'))
 
+@app.route('/api/portfolio')
+@login_required
+def portfolio_api():
+    _, _, analytics = get_portfolio_analytics(session['user_id'])
+    return jsonify({'summary': analytics.summary(), 'positions': analytics.positions()})
+
+@app.route('/api/portfolio/<symbol>/lots')
+@login_required
+def portfolio_lots_api(symbol):
+    lots = get_position_lots(session['user_id'], symbol.upper())
+    return jsonify([{
+        'id': lot.id,
+        'quantity': lot.quantity,
+        'purchase_price': lot.purchase_price,
+        'purchase_date': lot.purchase_date.strftime('%Y-%m-%d %H:%M:%S')
+    } for lot in lots])
+
 @app.route('/price/<symbol>')
 def get_price(symbol):
     price = get_stock_price(symbol)
@@ -389,46 +420,253 @@ def get_price(symbol):
     else:
         return {'error': 'Price not found'}, 404
 
+PRICE_STREAM_INTERVAL = float(os.getenv('PRICE_STREAM_INTERVAL', 5))
+PRICE_STREAM_KEEPALIVE = float(os.getenv('PRICE_STREAM_KEEPALIVE', 15))
+# Each open stream holds a worker thread; streams end after this many seconds
+# and the browser reconnects, and each user may hold only a few at once
+PRICE_STREAM_MAX_AGE = float(os.getenv('PRICE_STREAM_MAX_AGE', 300))
+PRICE_STREAMS_PER_USER = int(os.getenv('PRICE_STREAMS_PER_USER', 3))
+_open_streams = {}  # user_id -> open stream count in this process
+_open_streams_lock = threading.Lock()
+
+def _reserve_stream(user_id):
+    """Count a new stream for the user, or return None if they are at the limit."""
+    with _open_streams_lock:
+        if _open_streams.get(user_id, 0) >= PRICE_STREAMS_PER_USER:
+            return None
+        _open_streams[user_id] = _open_streams.get(user_id, 0) + 1
+    released = threading.Event()
+
+    def release():
+        if released.is_set():
+            return
+        released.set()
+        with _open_streams_lock:
+            _open_streams[user_id] -= 1
+            if not _open_streams[user_id]:
+                del _open_streams[user_id]
+    return release
+
+@app.route('/stream/prices')
+@login_required
+def stream_prices():
+    """
+    Server-Sent Events stream of price changes for the user's portfolio symbols.
+    
+    Only symbols whose price moved since the last event are sent. All
+    streams share one upstream poll per symbol through the price hub.
+    Streams end after PRICE_STREAM_MAX_AGE seconds (EventSource reconnects)
+    and a user may have at most PRICE_STREAMS_PER_USER open per process.
+    """
+    release = _reserve_stream(session['user_id'])
+    if release is None:
+        return {'error': 'Too many open price streams'}, 429
+    symbols = sorted({p.symbol.upper() for p in UserPortfolio.query.filter_by(user_id=session['user_id'])})
+    
+    def generate():
+        subscription = price_hub.subscribe(symbols)
+        ends_at = time.monotonic() + PRICE_STREAM_MAX_AGE
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                remaining = ends_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                updates = subscription.wait(timeout=min(PRICE_STREAM_KEEPALIVE, remaining))
+                deltas = {
+                    symbol: {'price': quote['current_price'], 'last_close': quote['last_closed_price']}
+                    for symbol, quote in updates.items()
+                    if quote['current_price'] is not None
+                }
+                if deltas:
+                    yield f"event: prices\ndata: {json.dumps(deltas)}\n\n"
+                else:
+                    yield ': keep-alive\n\n'
+        finally:
+            subscription.close()
+            release()
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also frees the slot when the client goes away before the stream starts
+    response.call_on_close(release)
+    return response
+
+@app.route('/cache/stats')
+@login_required
+def cache_stats():
+    return jsonify(dict(quote_cache.stats(), market_status=market_status_cache.stats(), fundamentals=fundamentals_cache.stats()))
+
+@app.route('/stream/stats')
+@login_required
+def stream_stats():
+    return jsonify(price_hub.stats())
+
+@app.route('/db/stats')
+@login_required
+def db_stats():
+    return jsonify(pool_metrics.snapshot())
+
+@app.route('/brokers/stats')
+@login_required
+def broker_stats():
+    return jsonify(dict(broker_pool.stats(), shared={'ib': ib_engine.stats(), 'alpaca': alpaca_engine.stats()}))
+
+@app.route('/rate-limits')
+@login_required
+def rate_limits():
+    return jsonify(limiter_stats())
+
+@app.route('/quotes/health')
+@login_required
+def quote_health():
+    return jsonify(dict(quote_fetcher.health(), hedged=quote_fetcher.stats()['hedged']))
+
+# Existing stats() counters, read at scrape time
+metrics_registry.register_stats('clicktrader_quote_cache', lambda: quote_cache.stats())
+metrics_registry.register_stats('clicktrader_market_status_cache', lambda: market_status_cache.stats())
+metrics_registry.register_stats('clicktrader_fundamentals_cache', lambda: fundamentals_cache.stats())
+metrics_registry.register_stats('clicktrader_db_pool', lambda: pool_metrics.snapshot())
+metrics_registry.register_stats('clicktrader_price_stream', lambda: price_hub.stats())
+metrics_registry.register_stats('clicktrader_broker_pool', lambda: broker_pool.stats())
+metrics_registry.register_stats('clicktrader_rate_limiter', limiter_stats, label='limiter')
+metrics_registry.register_stats('clicktrader_quote_provider', lambda: quote_fetcher.health(), label='provider')
+metrics_registry.register_stats('clicktrader_quote_fetcher', lambda: quote_fetcher.stats())
+metrics_registry.register_stats(
+    'clicktrader_broker',
+    lambda: {'ib': ib_engine.stats(), 'alpaca': alpaca_engine.stats()},
+    label='platform'
+)
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+@app.route('/metrics')
+def metrics():
+    """
+    Latency histograms and service counters in the Prometheus text format.
+
+    Scrapers can't log in, so they send METRICS_TOKEN as a bearer token
+    instead. The endpoint is closed while METRICS_TOKEN is unset.
+    """
+    header = request.headers.get('Authorization', '')
+    if not (METRICS_TOKEN and hmac.compare_digest(header.encode(), f"Bearer {METRICS_TOKEN}".encode())):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """List the slowest recently profiled requests (requires X-Profile-Token)."""
+    if not has_profiler_token():
+        return jsonify({'error': 'Unauthorized'}), 401
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify([record.summary() for record in request_profiler.slowest(limit)])
+
+@app.route('/admin/profiles/<profile_id>')
+def download_profile(profile_id):
+    """Download a profile as collapsed stacks, ready for flamegraph.pl or speedscope."""
+    if not has_profiler_token():
+        return jsonify({'error': 'Unauthorized'}), 401
+    record = request_profiler.get(profile_id)
+    if record is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(
+        record.collapsed(),
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'attachment; filename=profile-{record.id}.collapsed'}
+    )
+
+PRICES_MAX_SYMBOLS = int(os.getenv('PRICES_MAX_SYMBOLS', 200))
+PRICES_CLOSED_MAX_AGE = int(os.getenv('PRICES_CLOSED_MAX_AGE', 300))
+
+@app.route('/prices')
+@login_required
+def get_prices():
+    """
+    Get quotes for many symbols in one response, e.g. /prices?symbols=AAPL,MSFT
+    
+    Responses carry a strong ETag derived from the quote versions, so polling
+    clients get a 304 while prices haven't moved.
+    """
+    symbols = list(dict.fromkeys(s.strip().upper() for s in request.args.get('symbols', '').split(',') if s.strip()))
+    if not symbols:
+        return {'error': 'No symbols given'}, 400
+    if len(symbols) > PRICES_MAX_SYMBOLS:
+        return {'error': f'At most {PRICES_MAX_SYMBOLS} symbols per request'}, 400
+    
+    quotes = get_stock_prices(symbols)
+    payload = {
+        symbol: {
+            'price': quotes[symbol]['price'],
+            'last_close': quotes[symbol]['last_close'],
+            'change': quotes[symbol]['change'],
+            'change_percent': quotes[symbol]['change_percent'],
+            'timestamp': datetime.utcfromtimestamp(quotes[symbol]['as_of']).strftime('%Y-%m-%dT%H:%M:%SZ') if quotes[symbol]['as_of'] else None
+        }
+        for symbol in symbols
+    }
+    versions = json.dumps([[symbol, quotes[symbol]['price'], quotes[symbol]['as_of']] for symbol in symbols])
+    
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha1(versions.encode()).hexdigest())
+    # Quotes only move while a market is open; otherwise let clients back off,
+    # but never past the next session boundary
+    markets = {market_calendar.market_for_symbol(symbol) for symbol in symbols}
+    max_age = quote_cache.default_ttl if any(is_market_open(market) for market in markets) else PRICES_CLOSED_MAX_AGE
+    for market in markets:
+        until_boundary = market_calendar.seconds_until_transition(market)
+        if until_boundary is not None:
+            max_age = min(max_age, until_boundary)
+    response.cache_control.max_age = int(max_age)
+    response.cache_control.private = True
+    return response.make_conditional(request)
+
+SYMBOL_SEARCH_LIMIT = int(os.getenv('SYMBOL_SEARCH_LIMIT', 20))
+
+@app.route('/symbols/search')
+@login_required
+def search_symbols():
+    """
+    Autocomplete stock symbols, e.g. /symbols/search?q=bhp&market=asx
+    
+    Matches ticker prefixes first, then company names, then symbols one
+    typo away.
+    """
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), SYMBOL_SEARCH_LIMIT)
+    results = symbol_universe.search(query, request.args.get('market'), limit) if query else []
+    response = jsonify([listing._asdict() for listing in results])
+    # The universe only changes on restart
+    response.cache_control.max_age = 300
+    response.cache_control.private = True
+    return response
+
 @app.route('/price-check')
 @login_required
 def price_check():
     stocks = get_stocks_for_market('asx')  # Get ASX stocks
+    # Add .AX suffix for ASX stocks if not already present
+    yahoo_symbols = [f"{stock['symbol']}.AX" if not stock['symbol'].endswith('.AX') else stock['symbol'] for stock in stocks]
+    quotes = get_stock_prices(yahoo_symbols)
     stock_data = []
     
-    for stock in stocks:
-        symbol = stock['symbol']
-        # Add .AX suffix for ASX stocks if not already present
-        yahoo_symbol = f"{symbol}.AX" if not symbol.endswith('.AX') else symbol
-        
+    for stock, yahoo_symbol in zip(stocks, yahoo_symbols):
         price_info = {
-            'symbol': symbol,
+            'symbol': stock['symbol'],
             'price': 'Unable to determine price',
             'price_change': 0,
             'source': 'None',
             'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        try:
-            # Get data for the stock using yfinance
-            ticker = yf.Ticker(yahoo_symbol)
-            hist = ticker.history(period="2d")  # Get last 2 days to ensure we have the last close
-            
-            if not hist.empty:
-                # Get the last closing price (second last entry is the last *closed* price)
-                last_close = hist['Close'].iloc[-2]
-                # Get the previous day's close for price change calculation
-                prev_close = hist['Close'].iloc[-2]
-                current_price = hist['Close'].iloc[-1]
-                
-                # Calculate price change percentage
-                price_change = ((current_price - prev_close) / prev_close) * 100
-                
-                price_info['price'] = f"${current_price:.2f}"
-                price_info['price_change'] = price_change
-                price_info['source'] = 'Yahoo Finance'
-                price_info['last_close'] = f"${last_close:.2f}"
-        except Exception as e:
-            logging.warning(f"Error fetching price for {yahoo_symbol}: {str(e)}")
+        quote = quotes[yahoo_symbol.upper()]
+        if quote['price'] is not None and quote['last_close'] is not None:
+            price_info['price'] = f"${quote['price']:.2f}"
+            price_info['price_change'] = quote['change_percent'] or 0
+            price_info['source'] = 'Yahoo Finance'
+            price_info['last_close'] = f"${quote['last_close']:.2f}"
         
         stock_data.append(price_info)
     
@@ -459,7 +697,9 @@ def profile():
         user.primary_market = request.form.get('primary_market', 'asx')
         user.timezone = request.form.get('timezone', 'Australia/Sydney')
         
-        # Update Alpaca credentials
+        # Update Alpaca credentials, dropping any pooled client for the old ones
+        if user.alpaca_api_key and user.alpaca_secret_key:
+            broker_pool.discard(credentials_key('alpaca', user.alpaca_api_key, user.alpaca_secret_key))
         user.alpaca_api_key = request.form.get('alpaca_api_key')
         user.alpaca_secret_key = request.form.get('alpaca_secret_key')
         
@@ -489,20 +729,295 @@ def inject_user():
 
 def get_live_price(symbol: str) -> float:
     """
-    Get the current stock price using Alpaca if connected, otherwise fall back to Yahoo Finance.
+    Get the current stock price using Alpaca if connected, hedged with Yahoo Finance.
+    
+    Results are shared across requests through the process-wide quote cache.
     """
-    # Try Alpaca first
-    if TRADING_PLATFORM == 'alpaca' and alpaca_engine and alpaca_engine.connected:
-        try:
-            # Alpaca expects US symbols, but for ASX, use .AX suffix
-            alpaca_symbol = f"{symbol}.AX" if not symbol.endswith('.AX') else symbol
-            quote = alpaca_engine.api.get_latest_trade(alpaca_symbol)
-            return float(quote.price)
-        except Exception as e:
-            logging.warning(f"Alpaca price fetch failed for {symbol}: {e}. Falling back to Yahoo Finance.")
-            print(f"Alpaca price fetch failed for {symbol}: {e}. Falling back to Yahoo Finance.")  # Console message for exception
-    # Fallback to Yahoo Finance
-    return get_stock_price(symbol)
+    symbol = symbol.upper()
+    return quote_cache.get_or_load((symbol, 'live', 'price'), lambda: _fetch_live_price(symbol), ttl=quote_ttl(symbol))
+
+def get_live_prices(symbols, yahoo_quotes=None):
+    """
+    Get current prices for many symbols with one batched call per provider.
+    
+    Alpaca latest trades are requested in a single call when connected,
+    under the same hedge budget as single lookups; any symbol it has not
+    priced by then falls back to the batched Yahoo Finance quotes.
+    """
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    cached = quote_cache.get_many([(symbol, 'live', 'price') for symbol in symbols])
+    prices = {key[0]: value for key, value in cached.items()}
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if not missing:
+        return prices
+    
+    # Never waits past the hedge delay; skipped while Alpaca is disconnected or its breaker is open
+    prices.update(quote_fetcher.preferred_prices(missing))
+    
+    fallback = [symbol for symbol in missing if symbol not in prices]
+    if fallback:
+        if yahoo_quotes is None:
+            yahoo_quotes = get_stock_prices(fallback)
+        for symbol in fallback:
+            quote = yahoo_quotes.get(symbol)
+            if quote and quote['price']:
+                prices[symbol] = quote['price']
+    
+    for symbol in missing:
+        if symbol in prices:
+            quote_cache.set((symbol, 'live', 'price'), prices[symbol], quote_ttl(symbol))
+    return prices
+
+# Bounded pool that prices portfolios off the request thread, so a deadline can be applied
+QUOTE_WORKERS = int(os.getenv('QUOTE_WORKERS', 8))
+QUOTE_DEADLINE = float(os.getenv('QUOTE_DEADLINE', 2.0))
+quote_executor = ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix='quotes')
+
+# Stored prices older than this are re-fetched on the request path
+PRICE_MAX_STALENESS = int(os.getenv('PRICE_MAX_STALENESS', 120))
+
+def get_portfolio_quotes(symbols, deadline=QUOTE_DEADLINE):
+    """
+    Get current and last closed prices for portfolio symbols.
+    
+    All symbols are priced together on the shared quote pool: one batched
+    Yahoo Finance download (split only at its batch size) and one hedged
+    Alpaca batch call. Yahoo downloads run one at a time, so splitting a
+    page further would only queue them. If pricing does not finish within
+    the deadline (in seconds) the symbols are reported with status
+    'unavailable' rather than blocking the caller; the lookup keeps running
+    and warms the quote cache for the next request.
+    """
+    symbols = list(dict.fromkeys(s.upper() for s in symbols))
+    if not symbols:
+        return {}
+    future = quote_executor.submit(_quote_batch, symbols)
+    try:
+        return future.result(timeout=deadline)
+    except FutureTimeoutError:
+        logging.warning(f"Quote deadline of {deadline}s exceeded for {len(symbols)} symbols")
+    except Exception as e:
+        logging.error(f"Error pricing {', '.join(symbols)}: {str(e)}")
+    return {symbol: {'current_price': None, 'last_closed_price': None, 'status': 'unavailable'} for symbol in symbols}
+
+def get_portfolio_valuations(portfolios, max_staleness=PRICE_MAX_STALENESS):
+    """
+    Get prices for portfolio rows, preferring the values stored by the price refresher.
+    
+    Rows whose last_price was updated within max_staleness seconds are served
+    from the database; only the remaining symbols are priced upstream.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max_staleness)
+    results = {}
+    for p in portfolios:
+        symbol = p.symbol.upper()
+        if p.last_price and p.last_updated and p.last_updated >= cutoff and symbol not in results:
+            results[symbol] = {
+                'current_price': p.last_price,
+                'last_closed_price': quote_cache.get((symbol, 'yahoo', 'last_close')) or history_store.last_close(symbol, sync=False),
+                'status': 'stored'
+            }
+    missing = [p.symbol for p in portfolios if p.symbol.upper() not in results]
+    if missing:
+        results.update(get_portfolio_quotes(missing))
+    for p in portfolios:
+        quote = results[p.symbol.upper()]
+        if quote['status'] == 'unavailable' and p.last_price:
+            # Quote missed the deadline; fall back to the last stored price
+            quote.update(current_price=p.last_price, status='stale')
+    return results
+
+def get_aggregated_positions(user_id):
+    """
+    Get a user's holdings aggregated per symbol in SQL.
+    
+    Each row has the symbol, total quantity, quantity-weighted average
+    purchase price, number of lots, first purchase date, the id of the
+    lowest lot and the stored last_price/last_updated values.
+    """
+    total_quantity = func.sum(UserPortfolio.quantity)
+    return db.session.query(
+        UserPortfolio.symbol,
+        total_quantity.label('quantity'),
+        (func.sum(UserPortfolio.quantity * UserPortfolio.purchase_price) / total_quantity).label('purchase_price'),
+        func.count(UserPortfolio.id).label('lots'),
+        func.min(UserPortfolio.id).label('id'),
+        func.min(UserPortfolio.purchase_date).label('purchase_date'),
+        func.max(UserPortfolio.last_price).label('last_price'),
+        func.max(UserPortfolio.last_updated).label('last_updated')
+    ).filter(UserPortfolio.user_id == user_id).group_by(UserPortfolio.symbol).order_by(UserPortfolio.symbol).all()
+
+def get_position_lots(user_id, symbol):
+    """Get the individual purchases (lots) a user holds in one symbol."""
+    return UserPortfolio.query.filter_by(user_id=user_id, symbol=symbol).order_by(UserPortfolio.purchase_date).all()
+
+def get_portfolio_analytics(user_id):
+    """
+    Load a user's aggregated positions and value them, pricing each symbol once.
+    
+    Returns:
+        tuple: (aggregated positions, quotes by symbol, PortfolioAnalytics)
+    """
+    positions = get_aggregated_positions(user_id)
+    quotes = get_portfolio_valuations(positions)
+    return positions, quotes, PortfolioAnalytics.from_positions(positions, quotes)
+
+def _quote_batch(symbols):
+    quotes = get_stock_prices(symbols)
+    live_prices = get_live_prices(symbols, quotes)
+    return {
+        symbol: {
+            'current_price': live_prices.get(symbol),
+            'last_closed_price': quotes[symbol]['last_close'],
+            'status': 'live'
+        }
+        for symbol in symbols
+    }
+
+def _fetch_live_price(symbol: str):
+    return quote_fetcher.get_price(symbol)
+
+# Keep UserPortfolio.last_price fresh in the background
+price_refresher = PriceRefresher(
+    app, db, UserPortfolio,
+    fetch_quotes=lambda symbols: get_portfolio_quotes(symbols, deadline=None),
+    interval=int(os.getenv('PRICE_REFRESH_INTERVAL', 60))
+)
+
+# Connected broker clients for users with their own credentials
+broker_pool = BrokerClientPool(
+    max_size=int(os.getenv('BROKER_POOL_SIZE', 100)),
+    idle_timeout=float(os.getenv('BROKER_IDLE_TIMEOUT', 900)),
+    health_interval=float(os.getenv('BROKER_HEALTH_INTERVAL', 60))
+)
+
+def _connect_alpaca(api_key=None, api_secret=None):
+    trader = AlpacaTrader(api_key=api_key, api_secret=api_secret)
+    if not trader.connect():
+        raise ConnectionError('Could not connect to Alpaca with the stored credentials')
+    return trader
+
+# Application-wide broker clients, connected on first use rather than at import
+BROKER_RETRY_INTERVAL = float(os.getenv('BROKER_RETRY_INTERVAL', 60))
+ib_engine = LazyClient('ib', TradingEngine, retry_interval=BROKER_RETRY_INTERVAL)
+alpaca_engine = LazyClient('alpaca', _connect_alpaca, retry_interval=BROKER_RETRY_INTERVAL)
+
+def _quote_breaker(name):
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv('QUOTE_BREAKER_FAILURES', 5)),
+        latency_threshold=float(os.getenv('QUOTE_BREAKER_LATENCY', 2.0)),
+        reset_timeout=float(os.getenv('QUOTE_BREAKER_RESET', 30))
+    )
+
+# Live prices: Alpaca first (never waiting for its connection), Yahoo Finance
+# as the hedge when Alpaca is slow, failing or unavailable
+alpaca_provider = AlpacaProvider(
+    lambda: alpaca_engine.get(block=False) if TRADING_PLATFORM == 'alpaca' else None,
+    _quote_breaker('alpaca')
+)
+yahoo_provider = YahooProvider(_quote_breaker('yahoo'))
+quote_fetcher = HedgedQuoteFetcher(
+    [alpaca_provider, yahoo_provider],
+    hedge_delay=float(os.getenv('QUOTE_HEDGE_DELAY', 0.3)),
+    timeout=float(os.getenv('QUOTE_HEDGE_TIMEOUT', 5.0)),
+    workers=int(os.getenv('QUOTE_HEDGE_WORKERS', 8))
+)
+
+def get_alpaca_client(user):
+    """
+    Get a connected Alpaca client for the user.
+    
+    Users with their own API keys get a pooled per-user client; everyone
+    else shares the application account.
+    """
+    if user and user.alpaca_api_key and user.alpaca_secret_key:
+        return broker_pool.get(
+            credentials_key('alpaca', user.alpaca_api_key, user.alpaca_secret_key),
+            lambda: _connect_alpaca(user.alpaca_api_key, user.alpaca_secret_key)
+        )
+    return alpaca_engine.get()
+
+def submit_order_intent(intent):
+    """Submit a queued order intent to the broker it was placed with."""
+    if intent.platform == 'ib':
+        side = 'buy' if intent.quantity > 0 else 'sell'
+        engine = ib_engine.get()
+        if engine is None:
+            raise ConnectionError('Interactive Brokers is not available')
+        return bool(engine.place_order(intent.symbol, abs(intent.quantity), side, client_order_id=intent.client_order_id))
+    client = get_alpaca_client(db.session.get(User, intent.user_id))
+    if client is None:
+        raise ConnectionError('Alpaca is not connected')
+    return client.place_order(intent.symbol, intent.quantity, client_order_id=intent.client_order_id)
+
+def apply_submitted_order(intent):
+    """Reflect an accepted order in the user's portfolio."""
+    if intent.quantity > 0:
+        db.session.add(UserPortfolio(
+            user_id=intent.user_id,
+            symbol=intent.symbol,
+            quantity=intent.quantity,
+            purchase_price=intent.price
+        ))
+    elif intent.portfolio_id:
+        lot = db.session.get(UserPortfolio, intent.portfolio_id)
+        if lot is not None:
+            db.session.delete(lot)
+
+order_dispatcher = OrderDispatcher(
+    app, db, OrderIntent,
+    submit_order=submit_order_intent,
+    on_submitted=apply_submitted_order,
+    workers=int(os.getenv('ORDER_WORKERS', 4)),
+    lease_timeout=float(os.getenv('ORDER_LEASE_TIMEOUT', 300))
+)
+
+# One upstream poll per watched symbol, shared by every price stream
+price_hub = PriceHub(PollingPriceFeed(
+    lambda symbols: get_portfolio_quotes(symbols, deadline=None),
+    interval=PRICE_STREAM_INTERVAL
+))
+
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_services():
+    """
+    Create missing tables and start the background workers, once per process.
+
+    Nothing here runs at import, so importing the app (WSGI worker boot,
+    migrations) stays fast and never waits on a broker. It runs on the first
+    request, or up front via create_app().
+    """
+    global _services_started
+    if _services_started:
+        return
+    with _services_lock:
+        if _services_started:
+            return
+        with app.app_context():
+            # Create tables if they don't exist
+            db.create_all()
+            logging.info("Database tables checked/created.")
+        # Build the symbol search index off the request path; searches wait for it
+        threading.Thread(target=symbol_universe.load, name='symbol-universe', daemon=True).start()
+        if price_refresher.interval > 0:
+            price_refresher.start()
+        broker_pool.start()
+        # Connect the selected trading platform in the background
+        if TRADING_PLATFORM == 'ib':
+            ib_engine.connect_in_background()
+        elif TRADING_PLATFORM == 'alpaca':
+            alpaca_engine.connect_in_background()
+        order_dispatcher.recover()
+        _services_started = True
+
+def create_app():
+    """Get the application with its services already started (for WSGI servers)."""
+    start_services()
+    return app
 
 if __name__ == '__main__':
+    start_services()
     app.run(debug=os.getenv('FLASK_DEBUG', 'False').lower() == 'true')
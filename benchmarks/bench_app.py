@@ -0,0 +1,313 @@
+"""
+End-to-end benchmarks of ClickTrader's hot paths against fake upstreams.
+
+Usage:
+    python benchmarks/bench_app.py [--latency 0.05] [--failure-rate 0.0]
+                                   [--output results.json] [--compare old.json]
+
+Yahoo Finance and Alpaca are replaced in-process by the fakes in
+benchmarks/fakes.py, which return deterministic data after --latency
+seconds and fail --failure-rate of calls. Scenarios:
+
+    index         GET / for portfolios of increasing size (cold and warm cache)
+    price         /price/<symbol> throughput with distinct and repeated symbols
+    price_check   GET /price-check for increasingly large ASX universes
+    orders        order placement latency and end-to-end throughput
+    downloads     overlapping batched quote downloads; any missing or hung
+                  symbols mean yfinance.download calls were not serialized
+
+Results are written as JSON (with the git commit) so runs can be compared
+across commits; --compare prints the change against an earlier result file.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+SCENARIOS = ('index', 'price', 'price_check', 'orders', 'downloads')
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(durations):
+    return {
+        'count': len(durations),
+        'p50_ms': round(statistics.median(durations) * 1000, 3),
+        'p95_ms': round(percentile(durations, 95) * 1000, 3),
+        'max_ms': round(max(durations) * 1000, 3)
+    }
+
+def load_app(tmp):
+    """Import the app against a scratch database with fakes installed."""
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        'HISTORY_STORE_DIR': os.path.join(tmp, 'history'),
+        'LOG_FILE': os.path.join(tmp, 'app.log'),
+        'TRADING_PLATFORM': 'alpaca',
+        'ALPACA_API_KEY': 'bench',
+        'ALPACA_SECRET_KEY': 'bench',
+        'PRICE_REFRESH_INTERVAL': '0',
+        # Measure the app, not the upstream rate limits
+        'YAHOO_RATE_LIMIT': '1000000',
+        'YAHOO_RATE_BURST': '1000000',
+        'ALPACA_RATE_LIMIT': '1000000',
+        'ALPACA_RATE_BURST': '1000000'
+    })
+    import app as app_module
+    from alpaca_trader import AlpacaTrader
+
+    # Orders are only accepted while the market is open
+    app_module.is_market_open = lambda market='asx': True
+    AlpacaTrader.is_asx_market_open = lambda self: True
+    app_module.start_services()
+    logging.getLogger().setLevel(logging.WARNING)
+    return app_module
+
+def new_user(m):
+    client = m.app.test_client()
+    email = f"{uuid.uuid4().hex}@bench.local"
+    client.post('/register', data={'email': email, 'display_name': 'bench', 'password': 'bench'})
+    with m.app.app_context():
+        user_id = m.User.query.filter_by(email=email).first().id
+    return client, user_id
+
+def bench_index(m, upstream, sizes, repeat):
+    results = {}
+    for size in sizes:
+        client, user_id = new_user(m)
+        symbols = [f"SYM{i}" for i in range(min(size, 200))]
+        with m.app.app_context():
+            m.db.session.bulk_save_objects([
+                m.UserPortfolio(user_id=user_id, symbol=symbols[i % len(symbols)], quantity=10 + i % 90, purchase_price=50.0 + i % 50)
+                for i in range(size)
+            ])
+            m.db.session.commit()
+
+        m.quote_cache.clear()
+        upstream.reset()
+        start = time.perf_counter()
+        client.get('/')
+        cold = time.perf_counter() - start
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get('/')
+            warm.append(time.perf_counter() - start)
+        results[str(size)] = dict(summarize(warm), cold_ms=round(cold * 1000, 3), upstream_calls=dict(upstream.calls))
+    return results
+
+def run_threads(threads, work):
+    """Run work(thread_index) on each thread and return the wall time."""
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def bench_price(m, upstream, requests_per_thread, threads):
+    results = {}
+    for mode in ('distinct', 'repeated'):
+        m.quote_cache.clear()
+        upstream.reset()
+        durations = []
+        lock = threading.Lock()
+
+        def work(index):
+            client = m.app.test_client()
+            local = []
+            for i in range(requests_per_thread):
+                symbol = f"P{index}X{i}" if mode == 'distinct' else 'AAPL'
+                start = time.perf_counter()
+                client.get(f'/price/{symbol}')
+                local.append(time.perf_counter() - start)
+            with lock:
+                durations.extend(local)
+
+        wall = run_threads(threads, work)
+        results[mode] = dict(
+            summarize(durations),
+            requests_per_s=round(len(durations) / wall, 1),
+            upstream_calls=dict(upstream.calls)
+        )
+    return results
+
+def bench_price_check(m, upstream, sizes, tmp):
+    from symbol_universe import SymbolUniverse
+
+    client, _ = new_user(m)
+    original = m.symbol_universe
+    results = {}
+    try:
+        for size in sizes:
+            path = os.path.join(tmp, f'universe{size}.csv')
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['symbol', 'name', 'market'])
+                writer.writerows((f"A{i:04d}.AX", f"Bench Company {i}", 'asx') for i in range(size))
+            m.symbol_universe = SymbolUniverse(path).load()
+            m.quote_cache.clear()
+            upstream.reset()
+            start = time.perf_counter()
+            client.get('/price-check')
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            client.get('/price-check')
+            warm = time.perf_counter() - start
+            results[str(size)] = {
+                'cold_ms': round(cold * 1000, 3),
+                'warm_ms': round(warm * 1000, 3),
+                'upstream_calls': dict(upstream.calls)
+            }
+    finally:
+        m.symbol_universe = original
+    return results
+
+def bench_orders(m, upstream, count, timeout=120):
+    client, user_id = new_user(m)
+    m.quote_cache.clear()
+    upstream.reset()
+    symbols = ['AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOGL']
+    durations = []
+    start = time.perf_counter()
+    for i in range(count):
+        begin = time.perf_counter()
+        client.post('/', data={'stock_symbol': symbols[i % len(symbols)], 'quantity': '1', 'order_nonce': uuid.uuid4().hex})
+        durations.append(time.perf_counter() - begin)
+    enqueued = time.perf_counter() - start
+
+    # Wait for the dispatcher to finish every intent
+    deadline = time.monotonic() + timeout
+    with m.app.app_context():
+        while time.monotonic() < deadline:
+            statuses = dict(m.db.session.query(m.OrderIntent.status, m.func.count()).filter_by(user_id=user_id).group_by(m.OrderIntent.status).all())
+            m.db.session.remove()
+            if statuses.get('pending', 0) + statuses.get('submitting', 0) == 0:
+                break
+            time.sleep(0.01)
+    completed = time.perf_counter() - start
+    return dict(
+        summarize(durations),
+        enqueue_per_s=round(count / enqueued, 1),
+        completed_per_s=round(count / completed, 1),
+        statuses=statuses,
+        upstream_calls=dict(upstream.calls)
+    )
+
+def bench_downloads(m, upstream, threads, chunk=50):
+    from price_utils import get_stock_prices
+
+    m.quote_cache.clear()
+    upstream.reset()
+    missing = []
+    lock = threading.Lock()
+
+    def work(index):
+        symbols = [f"D{index}X{i}" for i in range(chunk)]
+        quotes = get_stock_prices(symbols, max_retries=1)
+        with lock:
+            missing.extend(symbol for symbol in symbols if quotes[symbol]['price'] is None)
+
+    wall = run_threads(threads, work)
+    return {
+        'symbols': threads * chunk,
+        'missing': len(missing),
+        'wall_ms': round(wall * 1000, 3),
+        'upstream_calls': dict(upstream.calls)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def flatten(data, prefix=''):
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = dict(flatten(json.load(f)['results']))
+    print(f"\n{'metric':<50} {'before':>12} {'after':>12} {'change':>8}")
+    for name, value in flatten(current):
+        before = previous.get(name)
+        if before is None or 'upstream_calls' in name:
+            continue
+        change = f"{(value - before) / before * 100:+.1f}%" if before else 'n/a'
+        print(f"{name:<50} {before:>12} {value:>12} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per fake upstream call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of fake upstream calls that fail')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--portfolio-sizes', default='10,100,1000')
+    parser.add_argument('--universe-sizes', default='50,500,2000')
+    parser.add_argument('--repeat', type=int, default=10, help='Warm repetitions per index size')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50, help='/price requests per thread')
+    parser.add_argument('--orders', type=int, default=100)
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        upstream = fakes.install(args.latency, args.failure_rate, args.seed)
+        m = load_app(tmp)
+        results = {}
+        if 'index' in scenarios:
+            results['index'] = bench_index(m, upstream, [int(s) for s in args.portfolio_sizes.split(',')], args.repeat)
+        if 'price' in scenarios:
+            results['price'] = bench_price(m, upstream, args.requests, args.threads)
+        if 'price_check' in scenarios:
+            results['price_check'] = bench_price_check(m, upstream, [int(s) for s in args.universe_sizes.split(',')], tmp)
+        if 'orders' in scenarios:
+            results['orders'] = bench_orders(m, upstream, args.orders)
+        if 'downloads' in scenarios:
+            results['downloads'] = bench_downloads(m, upstream, args.threads)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'config': {
+            'latency': args.latency,
+            'failure_rate': args.failure_rate,
+            'seed': args.seed,
+            'threads': args.threads
+        },
+        'results': results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
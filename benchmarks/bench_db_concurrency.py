@@ -0,0 +1,92 @@
+"""
+Compare concurrent read/write throughput on SQLite with the default engine
+settings and with the tuned profile from db_config.engine_options.
+
+Usage:
+    python benchmarks/bench_db_concurrency.py [--readers 8] [--writers 2] [--seconds 5]
+
+Each reader repeatedly runs the aggregated-portfolio query while writers
+insert rows in short transactions, mimicking page views alongside the price
+refresher and order fills.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from db_config import engine_options, pool_metrics
+
+SCHEMA = """
+CREATE TABLE user_portfolio (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    symbol VARCHAR(10) NOT NULL,
+    quantity INTEGER NOT NULL,
+    purchase_price FLOAT NOT NULL
+)
+"""
+READ = text(
+    "SELECT symbol, SUM(quantity), SUM(quantity * purchase_price) / SUM(quantity) "
+    "FROM user_portfolio WHERE user_id = :user_id GROUP BY symbol"
+)
+WRITE = text(
+    "INSERT INTO user_portfolio (user_id, symbol, quantity, purchase_price) "
+    "VALUES (:user_id, :symbol, 10, 100.0)"
+)
+
+def run(engine, readers, writers, seconds):
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA))
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(statement, key, user_id):
+        done = errors = 0
+        while time.monotonic() < deadline:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(statement, {'user_id': user_id, 'symbol': f"S{done % 50}"})
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts[key] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=(READ, 'reads', i % 20)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=(WRITE, 'writes', i % 20)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profiles = {
+            'default': lambda uri: create_engine(uri),
+            'tuned': lambda uri: create_engine(uri, **engine_options(uri))
+        }
+        print(f"{'profile':>8} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+        for name, factory in profiles.items():
+            uri = f"sqlite:///{os.path.join(tmp, name + '.db')}"
+            counts = run(factory(uri), args.readers, args.writers, args.seconds)
+            print(f"{name:>8} {counts['reads'] / args.seconds:>10.0f} {counts['writes'] / args.seconds:>10.0f} {counts['errors']:>8}")
+        print(f"tuned pool: {pool_metrics.snapshot()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark PortfolioAnalytics against portfolio size.
+
+Usage:
+    python benchmarks/bench_portfolio_analytics.py [--repeat N]
+
+Per-position cost should stay flat from 10 up to 10k positions.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio_analytics import PortfolioAnalytics
+
+SIZES = [10, 100, 1000, 10000]
+
+def make_portfolio(size, symbols=500, seed=42):
+    rng = random.Random(seed)
+    universe = [f"SYM{i}" for i in range(min(size, symbols))]
+    positions = [
+        SimpleNamespace(symbol=rng.choice(universe), quantity=rng.randint(1, 500), purchase_price=rng.uniform(5, 500))
+        for _ in range(size)
+    ]
+    quotes = {
+        symbol: {'current_price': rng.uniform(5, 500), 'last_closed_price': rng.uniform(5, 500)}
+        for symbol in universe
+    }
+    return positions, quotes
+
+def run(size, repeat):
+    positions, quotes = make_portfolio(size)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analytics = PortfolioAnalytics.from_positions(positions, quotes)
+        analytics.summary()
+        analytics.positions()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'positions':>10} {'total ms':>10} {'us/position':>12}")
+    for size in SIZES:
+        elapsed = run(size, args.repeat)
+        print(f"{size:>10} {elapsed * 1000:>10.3f} {elapsed / size * 1e6:>12.3f}")
+
+if __name__ == '__main__':
+    main()
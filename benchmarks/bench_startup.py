@@ -0,0 +1,85 @@
+"""
+Measure application startup: how long `import app` takes in a fresh
+interpreter, and how long the first and second requests take after it.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--platform none] [--top 10]
+
+Each run uses a new interpreter and an empty SQLite database, so the first
+request includes the one-off service startup (table creation, background
+workers). --top lists the slowest imports of one run from -X importtime.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/login')
+first = time.perf_counter()
+client.get('/login')
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_request': first - imported,
+    'second_request': second - first
+}))
+"""
+
+def run_child(env, extra_args=()):
+    return subprocess.run(
+        [sys.executable, *extra_args, '-c', CHILD],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--platform', default='none', help='TRADING_PLATFORM for the app under test')
+    parser.add_argument('--top', type=int, default=0, help='Show the N slowest imports')
+    args = parser.parse_args()
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            TRADING_PLATFORM=args.platform,
+            PRICE_REFRESH_INTERVAL='0',
+            LOG_FILE=os.path.join(tmp, 'app.log'),
+            HISTORY_STORE_DIR=os.path.join(tmp, 'history')
+        )
+        for i in range(args.runs):
+            env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, f'startup{i}.db')}"
+            result = run_child(env)
+            samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        print(f"{'phase':>15} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+        for phase in ('import', 'first_request', 'second_request'):
+            values = [sample[phase] * 1000 for sample in samples]
+            print(f"{phase:>15} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+
+        if args.top:
+            env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'importtime.db')}"
+            result = run_child(env, ('-X', 'importtime'))
+            rows = []
+            for line in result.stderr.splitlines():
+                if not line.startswith('import time:') or 'cumulative' in line:
+                    continue
+                _, cumulative, name = line[len('import time:'):].split('|')
+                rows.append((int(cumulative), name.strip()))
+            print("\nslowest imports (cumulative ms):")
+            for cumulative, name in sorted(rows, reverse=True)[:args.top]:
+                print(f"{cumulative / 1000:>10.1f}  {name}")
+
+if __name__ == '__main__':
+    main()
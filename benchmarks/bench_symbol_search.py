@@ -0,0 +1,99 @@
+"""
+Benchmark SymbolIndex build time and search latency against universe size.
+
+Usage:
+    python benchmarks/bench_symbol_search.py [--sizes 1000,10000,50000] [--queries 2000]
+
+Universes are generated with exchange-like tickers and multi-word company
+names, so the 10k+ sizes approximate the full NASDAQ, NYSE and ASX
+listings that `python symbol_universe.py --refresh` downloads. Queries mix
+symbol prefixes, name prefixes, later name words, one-character typos and
+misses. Search latency should stay well under a millisecond and roughly
+flat as the universe grows.
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from symbol_universe import Listing, SymbolIndex
+
+WORDS = [
+    'American', 'Pacific', 'Global', 'Resources', 'Mining', 'Energy', 'Capital', 'Holdings',
+    'Technologies', 'Bank', 'Financial', 'Health', 'Therapeutics', 'Gold', 'Lithium', 'Minerals',
+    'Software', 'Systems', 'Industries', 'Property', 'Trust', 'Group', 'Networks', 'Medical',
+    'Biotech', 'Retail', 'Foods', 'Airlines', 'Logistics', 'Semiconductor', 'Solar', 'Water'
+]
+SUFFIXES = ['Inc', 'Corp', 'Limited', 'Ltd', 'PLC', 'Co']
+MARKETS = [('nasdaq', ''), ('nyse', ''), ('asx', '.AX')]
+
+def make_universe(size, seed=42):
+    rng = random.Random(seed)
+    listings, seen = [], set()
+    while len(listings) < size:
+        market, suffix = rng.choice(MARKETS)
+        code = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(2 if suffix else 1, 4 if suffix else 5)))
+        symbol = code + suffix
+        if symbol in seen:
+            continue
+        seen.add(symbol)
+        name = ' '.join(rng.sample(WORDS, rng.randint(1, 3)) + [rng.choice(SUFFIXES)])
+        listings.append(Listing(symbol, name, market))
+    return listings
+
+def make_queries(listings, count, seed=7):
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        listing = rng.choice(listings)
+        code = listing.symbol.split('.')[0]
+        kind = i % 5
+        if kind == 0:
+            queries.append(code[:rng.randint(1, len(code))])
+        elif kind == 1:
+            queries.append(listing.name[:rng.randint(2, 8)])
+        elif kind == 2:
+            queries.append(rng.choice(listing.name.split()[1:] or listing.name.split())[:5])
+        elif kind == 3 and len(code) > 2:
+            queries.append(code[:1] + 'Q' + code[1:])
+        else:
+            queries.append(''.join(rng.choices(string.ascii_uppercase, k=6)) + 'ZZ')
+    return queries
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def run(size, query_count):
+    listings = make_universe(size)
+    start = time.perf_counter()
+    index = SymbolIndex(listings)
+    build = time.perf_counter() - start
+    durations = []
+    for query in make_queries(listings, query_count):
+        start = time.perf_counter()
+        index.search(query)
+        durations.append(time.perf_counter() - start)
+    return build, durations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'listings':>10} {'build ms':>10} {'p50 us':>10} {'p95 us':>10} {'max us':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        build, durations = run(size, args.queries)
+        print(
+            f"{size:>10} {build * 1000:>10.1f} {statistics.median(durations) * 1e6:>10.1f} "
+            f"{percentile(durations, 95) * 1e6:>10.1f} {max(durations) * 1e6:>10.1f}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+In-process stand-ins for the Yahoo Finance and Alpaca clients.
+
+install() swaps yfinance.Ticker, yfinance.download and
+alpaca_trade_api.REST for fakes that return deterministic data after a
+configurable delay, and fail a configurable fraction of calls. Like the
+real yfinance.download, the fake download keeps its results in shared
+module state, so overlapping calls lose tickers or hang. The app
+imports these modules lazily and looks the attributes up on every call, so
+patching the modules is enough.
+"""
+import random
+import threading
+import time
+import uuid
+import zlib
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+class FakeUpstream:
+    """Shared latency, failure injection and call counting for the fakes."""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            fail = self._rng.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError(f"Injected failure in {name}")
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = {}
+
+def base_price(symbol: str) -> float:
+    """Stable per-symbol price level, so runs are comparable across commits."""
+    return 5 + zlib.crc32(symbol.upper().encode()) % 500
+
+def bars(symbol: str, days: int, end: date = None) -> pd.DataFrame:
+    end = end or date.today()
+    index = pd.bdate_range(end=end, periods=days)
+    base = base_price(symbol)
+    # Deterministic random walk seeded by the symbol
+    steps = np.random.default_rng(zlib.crc32(symbol.encode())).normal(0, 0.01, days)
+    close = base * np.exp(np.cumsum(steps))
+    return pd.DataFrame({
+        'Open': close * 0.995,
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': np.full(days, 1_000_000.0)
+    }, index=index)
+
+PERIOD_DAYS = {'1d': 1, '2d': 2, '5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, '1y': 252, '2y': 504}
+
+def make_ticker(upstream: FakeUpstream):
+    class FakeTicker:
+        def __init__(self, symbol):
+            self.symbol = symbol.upper()
+
+        def history(self, period='1mo', start=None, **kwargs):
+            upstream.call('yahoo.history')
+            if start is not None:
+                days = max(len(pd.bdate_range(start=start, end=date.today())), 0)
+            else:
+                days = PERIOD_DAYS.get(period, 21)
+            return bars(self.symbol, days) if days else pd.DataFrame()
+
+        @property
+        def info(self):
+            upstream.call('yahoo.info')
+            price = base_price(self.symbol)
+            return {
+                'longName': f"{self.symbol} Holdings",
+                'sector': 'Technology',
+                'industry': 'Software',
+                'marketCap': int(price * 1e9),
+                'trailingPE': 20.0,
+                'dividendYield': 0.02,
+                'fiftyTwoWeekHigh': price * 1.2,
+                'fiftyTwoWeekLow': price * 0.8,
+                'volume': 1_000_000,
+                'averageVolume': 1_200_000
+            }
+    return FakeTicker
+
+def make_download(upstream: FakeUpstream, hang_timeout: float = 5.0):
+    # Like yfinance.shared._DFS: one module-level result dict, reset by every call
+    shared = SimpleNamespace(dfs={})
+
+    def download(tickers, period='5d', group_by='column', start=None, **kwargs):
+        upstream.call('yahoo.download')
+        symbols = [s.upper() for s in (tickers.split() if isinstance(tickers, str) else tickers)]
+        if start is not None:
+            days = max(len(pd.bdate_range(start=start, end=date.today())), 0)
+        else:
+            days = PERIOD_DAYS.get(period, 5)
+        # yfinance resets the globals, fills them per ticker and then spins until
+        # it has as many entries as tickers, so an overlapping call drops tickers
+        # from this one or leaves it waiting for entries that never arrive
+        shared.dfs = {}
+        for symbol in symbols:
+            time.sleep(0)
+            shared.dfs[symbol] = bars(symbol, days) if days else pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        deadline = time.monotonic() + hang_timeout
+        while len(shared.dfs) < len(symbols):
+            if time.monotonic() > deadline:
+                with upstream._lock:
+                    upstream.calls['yahoo.download.hung'] = upstream.calls.get('yahoo.download.hung', 0) + 1
+                raise TimeoutError('download never collected every ticker')
+            time.sleep(0.001)
+        frames = {symbol: shared.dfs[symbol] for symbol in symbols if symbol in shared.dfs}
+        dropped = len(symbols) - len(frames)
+        if dropped:
+            with upstream._lock:
+                upstream.calls['yahoo.download.dropped'] = upstream.calls.get('yahoo.download.dropped', 0) + dropped
+        if not frames:
+            return pd.DataFrame()
+        if len(symbols) == 1 and group_by != 'ticker':
+            return next(iter(frames.values()))
+        return pd.concat(frames, axis=1)
+    return download
+
+def make_rest(upstream: FakeUpstream):
+    class FakeREST:
+        def __init__(self, key_id=None, secret_key=None, base_url=None, api_version=None, **kwargs):
+            self.orders = {}
+            self._lock = threading.Lock()
+
+        def get_account(self):
+            upstream.call('alpaca.get_account')
+            return SimpleNamespace(status='ACTIVE', cash='100000', equity='100000', portfolio_value='100000', buying_power='100000')
+
+        def get_latest_trade(self, symbol):
+            upstream.call('alpaca.get_latest_trade')
+            return SimpleNamespace(price=base_price(symbol))
+
+        def get_latest_trades(self, symbols):
+            upstream.call('alpaca.get_latest_trades')
+            return {symbol: SimpleNamespace(price=base_price(symbol)) for symbol in symbols}
+
+        def submit_order(self, symbol, qty, side, type='market', time_in_force='day', client_order_id=None, **kwargs):
+            upstream.call('alpaca.submit_order')
+            order = SimpleNamespace(
+                id=uuid.uuid4().hex, client_order_id=client_order_id, symbol=symbol,
+                qty=qty, side=side, type=type, status='accepted'
+            )
+            with self._lock:
+                if client_order_id in self.orders:
+                    raise ValueError('client_order_id must be unique')
+                self.orders[client_order_id] = order
+            return order
+
+        def get_order_by_client_order_id(self, client_order_id):
+            upstream.call('alpaca.get_order')
+            with self._lock:
+                order = self.orders.get(client_order_id)
+            if order is None:
+                raise ValueError('order not found')
+            return order
+    return FakeREST
+
+def install(latency: float = 0.0, failure_rate: float = 0.0, seed: int = 42) -> FakeUpstream:
+    """Patch yfinance and alpaca_trade_api with fakes sharing one FakeUpstream."""
+    import alpaca_trade_api
+    import yfinance
+
+    upstream = FakeUpstream(latency, failure_rate, seed)
+    yfinance.Ticker = make_ticker(upstream)
+    yfinance.download = make_download(upstream)
+    alpaca_trade_api.REST = make_rest(upstream)
+    return upstream
@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+def credentials_key(platform: str, *parts) -> tuple:
+    """
+    Build a pool key from broker credentials.
+
+    Secrets are hashed so they are never kept around as dictionary keys.
+    """
+    return (platform,) + tuple(
+        hashlib.sha256(str(part).encode()).hexdigest() if isinstance(part, str) else part
+        for part in parts
+    )
+
+class BrokerClientPool:
+    """
+    Per-user pool of connected broker clients.
+
+    Clients are created lazily on first use, reused across requests (keeping
+    their HTTP sessions), health-checked in the background and evicted
+    least-recently-used when the pool is full or when idle for too long.
+    """
+
+    def __init__(self, max_size: int = 100, idle_timeout: float = 900, health_interval: float = 60):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._clients = OrderedDict()  # key -> [client, last_used]
+        self._creating: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.health_failures = 0
+
+    def get(self, key: Hashable, create: Callable[[], object]):
+        """
+        Get the client for key, creating and connecting it with create() if needed.
+
+        create must return a connected client or raise; failures are not cached.
+        """
+        while True:
+            with self._lock:
+                entry = self._clients.get(key)
+                if entry is not None:
+                    entry[1] = time.monotonic()
+                    self._clients.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                pending = self._creating.get(key)
+                if pending is None:
+                    self._creating[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another request is already connecting this client
+            pending.wait()
+
+        try:
+            client = create()
+            with self._lock:
+                self._clients[key] = [client, time.monotonic()]
+                evicted = self._evict_over_capacity()
+        finally:
+            with self._lock:
+                self._creating.pop(key).set()
+        for old in evicted:
+            self._close(old)
+        return client
+
+    def _evict_over_capacity(self):
+        evicted = []
+        while len(self._clients) > self.max_size:
+            _, (client, _) = self._clients.popitem(last=False)
+            self.evictions += 1
+            evicted.append(client)
+        return evicted
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._clients.pop(key, None)
+        if entry is not None:
+            self._close(entry[0])
+
+    @staticmethod
+    def _close(client) -> None:
+        try:
+            disconnect = getattr(client, 'disconnect', None)
+            if disconnect:
+                disconnect()
+        except Exception as e:
+            logger.warning(f"Error disconnecting broker client: {str(e)}")
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='broker-health', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                logger.error(f"Broker pool maintenance failed: {str(e)}")
+
+    def maintain(self) -> None:
+        """Evict idle clients and drop the ones failing their health check."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [key for key, (_, last_used) in self._clients.items() if last_used < cutoff]
+            for key in idle:
+                self.evictions += 1
+            idle_clients = [self._clients.pop(key)[0] for key in idle]
+            remaining = list(self._clients.items())
+        for client in idle_clients:
+            self._close(client)
+
+        for key, (client, _) in remaining:
+            health_check = getattr(client, 'health_check', None)
+            if health_check is None or health_check():
+                continue
+            self.health_failures += 1
+            logger.warning(f"Dropping unhealthy {key[0]} client from the broker pool")
+            self.discard(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': len(self._clients),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'health_failures': self.health_failures
+            }
+
+class LazyClient:
+    """
+    A single shared broker client, connected on first use.
+
+    Connecting never happens at import time. Request paths that can do
+    without the broker call get(block=False), which returns None and starts
+    connecting in the background instead of waiting. A failed connection is
+    retried only after retry_interval seconds.
+    """
+
+    def __init__(self, name: str, create: Callable[[], object], retry_interval: float = 60):
+        self.name = name
+        self._create = create
+        self.retry_interval = retry_interval
+        self._client = None
+        self._retry_at = 0.0
+        self._connect_lock = threading.Lock()  # Serializes connection attempts
+        self._lock = threading.Lock()  # Guards starting the background thread only
+        self._thread = None
+
+    def get(self, block: bool = True):
+        """
+        Get the connected client, or None if it is unavailable.
+
+        Args:
+            block (bool): Connect now if needed; otherwise start connecting
+                in the background and return None until that finishes
+        """
+        client = self._client
+        if client is not None:
+            return client
+        if not block:
+            self.connect_in_background()
+            return None
+        with self._connect_lock:
+            if self._client is None and time.monotonic() >= self._retry_at:
+                try:
+                    self._client = self._create()
+                    logger.info(f"Connected shared {self.name} client")
+                except Exception as e:
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    logger.error(f"Error connecting shared {self.name} client: {str(e)}")
+            return self._client
+
+    def connect_in_background(self) -> None:
+        if self._client is not None or time.monotonic() < self._retry_at:
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.get, name=f"{self.name}-connect", daemon=True)
+            self._thread.start()
+
+    def stats(self) -> Dict:
+        return {'connected': self._client is not None, 'retry_in': max(0.0, round(self._retry_at - time.monotonic(), 1))}
@@ -0,0 +1,152 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from metrics import db_query_latency
+
+logger = logging.getLogger(__name__)
+
+class PoolMetrics:
+    """Process-wide connection pool checkout statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.in_use = 0
+        self.capacity = 0
+        self.peak_in_use = 0
+
+    def record_checkout(self, wait: float, in_use: int, capacity: int, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.in_use = in_use
+            self.capacity = capacity
+            self.peak_in_use = max(self.peak_in_use, in_use)
+
+    def record_checkin(self, in_use: int) -> None:
+        with self._lock:
+            self.in_use = in_use
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'total_wait': round(self.total_wait, 6),
+                'avg_wait': round(self.total_wait / attempts, 6) if attempts else 0.0,
+                'max_wait': round(self.max_wait, 6),
+                'in_use': self.in_use,
+                'capacity': self.capacity,
+                'peak_in_use': self.peak_in_use,
+                'saturation': round(self.in_use / self.capacity, 4) if self.capacity else 0.0
+            }
+
+pool_metrics = PoolMetrics()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _capacity(self) -> int:
+        return self.size() + max(self._max_overflow, 0)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.record_checkout(time.perf_counter() - start, self.checkedout(), self._capacity(), timed_out=True)
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - start, self.checkedout(), self._capacity())
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        pool_metrics.record_checkin(self.checkedout())
+
+@event.listens_for(InstrumentedQueuePool, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply per-connection PRAGMAs to new SQLite connections."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers proceed while a writer holds the lock
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    finally:
+        cursor.close()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    """Observe statement latency, labelled by its leading keyword (SELECT, INSERT, ...)."""
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    db_query_latency.observe(elapsed, operation)
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(exception_context):
+    # Failed statements never reach after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+def engine_options(uri: str) -> Dict:
+    """
+    Get SQLAlchemy engine options for the configured database URL.
+
+    File-backed SQLite gets a thread-shareable instrumented pool whose
+    connections run in WAL mode; other databases get explicit pool size,
+    overflow, timeout and recycle settings.
+
+    Args:
+        uri (str): The SQLALCHEMY_DATABASE_URI
+
+    Returns:
+        Dict: Options for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri:
+            # In-memory databases live in a single connection; keep the defaults
+            return {}
+        return {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+            'connect_args': {
+                'check_same_thread': False,
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000
+            }
+        }
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
@@ -0,0 +1,275 @@
+"""
+Disk-backed cache of company fundamentals (sector, market cap, 52-week range).
+
+Usage:
+    python fundamentals_cache.py --warm [--market all] [--no-held] [--workers 4]
+    python fundamentals_cache.py BHP.AX
+
+--warm fetches fundamentals for every listed symbol of the market and every
+symbol held in a portfolio, skipping those already cached and fresh.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class FundamentalsCache:
+    """
+    SQLite cache of fundamentals with daily expiry and stale-while-revalidate.
+
+    Fresh entries are a local read. Expired entries are still returned at
+    once while a background worker refetches them, so only the first lookup
+    of a symbol ever waits on Yahoo Finance. Concurrent misses for a symbol
+    share one fetch. Failed fetches are not stored, but the symbol is not
+    fetched again for failure_ttl seconds.
+    """
+
+    def __init__(self, path: str, load: Callable[[str], Optional[Dict]], ttl: float = 86400,
+                 refresh_workers: int = 2, failure_ttl: float = 300):
+        self.path = path
+        self.load = load
+        self.ttl = ttl
+        self.refresh_workers = refresh_workers
+        self.failure_ttl = failure_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._loading: Dict[str, _Load] = {}
+        self._failed: Dict[str, float] = {}  # symbol -> monotonic time it may be fetched again
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.collapsed = 0
+        self.suppressed = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; the table is created on first use, not at import
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS fundamentals ('
+                'symbol TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def _read(self, symbol: str):
+        return self._connection().execute(
+            'SELECT data, fetched_at FROM fundamentals WHERE symbol = ?', (symbol,)
+        ).fetchone()
+
+    def _write(self, symbol: str, data: Dict) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO fundamentals (symbol, data, fetched_at) VALUES (?, ?, ?)',
+                (symbol, json.dumps(data), time.time())
+            )
+
+    def refresh(self, symbol: str) -> Optional[Dict]:
+        """Fetch and store fundamentals for a symbol now."""
+        symbol = symbol.upper()
+        try:
+            data = self.load(symbol)
+        except Exception as e:
+            logger.error(f"Error fetching fundamentals for {symbol}: {str(e)}")
+            data = None
+        with self._lock:
+            if data is None:
+                self.failures += 1
+                self._failed[symbol] = time.monotonic() + self.failure_ttl
+            else:
+                self.refreshes += 1
+                self._failed.pop(symbol, None)
+        if data is not None:
+            try:
+                self._write(symbol, data)
+            except sqlite3.Error as e:
+                logger.error(f"Error writing fundamentals cache for {symbol}: {str(e)}")
+        return data
+
+    def _recently_failed(self, symbol: str) -> bool:
+        # Caller holds self._lock
+        retry_at = self._failed.get(symbol)
+        if retry_at is None:
+            return False
+        if time.monotonic() < retry_at:
+            self.suppressed += 1
+            return True
+        del self._failed[symbol]
+        return False
+
+    def _load_once(self, symbol: str) -> Optional[Dict]:
+        """Fetch a missing symbol, sharing the fetch with concurrent callers."""
+        with self._lock:
+            if self._recently_failed(symbol):
+                return None
+            flight = self._loading.get(symbol)
+            leader = flight is None
+            if leader:
+                flight = self._loading[symbol] = _Load()
+            else:
+                self.collapsed += 1
+        if not leader:
+            flight.done.wait()
+            return flight.value
+        try:
+            flight.value = self.refresh(symbol)
+        finally:
+            with self._lock:
+                self._loading.pop(symbol, None)
+            flight.done.set()
+        return flight.value
+
+    def _refresh_in_background(self, symbol: str) -> None:
+        with self._lock:
+            if symbol in self._refreshing or self._recently_failed(symbol):
+                return
+            self._refreshing.add(symbol)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.refresh_workers, thread_name_prefix='fundamentals')
+        self._executor.submit(self._background_refresh, symbol)
+
+    def _background_refresh(self, symbol: str) -> None:
+        try:
+            self.refresh(symbol)
+        except Exception as e:
+            logger.error(f"Error refreshing fundamentals for {symbol}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(symbol)
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """
+        Get fundamentals for a symbol.
+
+        Args:
+            symbol (str): The stock symbol
+
+        Returns:
+            Optional[Dict]: Cached fundamentals (possibly up to a refresh
+            behind), or None if nothing is cached and the fetch failed now
+            or within the last failure_ttl seconds
+        """
+        symbol = symbol.upper()
+        try:
+            row = self._read(symbol)
+        except sqlite3.Error as e:
+            logger.error(f"Error reading fundamentals cache for {symbol}: {str(e)}")
+            row = None
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return self._load_once(symbol)
+        data, fetched_at = row
+        if time.time() - fetched_at >= self.ttl:
+            with self._lock:
+                self.stale += 1
+            self._refresh_in_background(symbol)
+        else:
+            with self._lock:
+                self.hits += 1
+        return json.loads(data)
+
+    def stale_symbols(self, symbols: Iterable[str]) -> List[str]:
+        """Get the symbols that are missing or expired."""
+        cutoff = time.time() - self.ttl
+        fresh = {
+            symbol for symbol, in self._connection().execute(
+                'SELECT symbol FROM fundamentals WHERE fetched_at > ?', (cutoff,)
+            )
+        }
+        return [symbol for symbol in dict.fromkeys(s.upper() for s in symbols) if symbol not in fresh]
+
+    def warm(self, symbols: Iterable[str], workers: int = 4) -> Dict:
+        """
+        Fetch fundamentals for every missing or expired symbol.
+
+        Returns:
+            Dict: Counts of symbols requested, skipped, fetched and failed
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        pending = self.stale_symbols(symbols)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='fundamentals-warm') as executor:
+            results = list(executor.map(self.refresh, pending))
+        fetched = sum(1 for data in results if data is not None)
+        return {
+            'requested': len(symbols),
+            'skipped': len(symbols) - len(pending),
+            'fetched': fetched,
+            'failed': len(pending) - fetched
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale': self.stale,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'collapsed': self.collapsed,
+                'suppressed': self.suppressed,
+                'refreshing': len(self._refreshing)
+            }
+
+class _Load:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+def held_symbols() -> List[str]:
+    """Every symbol held in any portfolio."""
+    from app import app, db, UserPortfolio
+    try:
+        with app.app_context():
+            return [symbol for symbol, in db.session.query(UserPortfolio.symbol).distinct()]
+    except Exception as e:
+        logger.error(f"Error reading held symbols: {str(e)}")
+        return []
+
+def main():
+    from logging_setup import configure_logging
+    from price_utils import fundamentals_cache
+    from symbol_universe import symbol_universe
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('symbols', nargs='*', help='Symbols to look up')
+    parser.add_argument('--warm', action='store_true', help='Fetch every listed and held symbol that is missing or expired')
+    parser.add_argument('--market', default='all', help='Market whose listings to warm (asx, nyse, nasdaq or all)')
+    parser.add_argument('--no-held', action='store_true', help="Don't include symbols held in portfolios")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.warm:
+        market = None if args.market.lower() == 'all' else args.market
+        symbols = [listing['symbol'] for listing in symbol_universe.listings(market)]
+        if not args.no_held:
+            symbols += held_symbols()
+        start = time.perf_counter()
+        report = fundamentals_cache.warm(symbols, args.workers)
+        print(
+            f"Warmed fundamentals for {report['requested']} symbols in {time.perf_counter() - start:.1f}s: "
+            f"{report['skipped']} fresh, {report['fetched']} fetched, {report['failed']} failed"
+        )
+    for symbol in args.symbols:
+        print(json.dumps(fundamentals_cache.get(symbol), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+import market_calendar
+from metrics import upstream_call
+from rate_limiter import get_limiter, get_upstream_lock
+
+# yfinance and pandas are slow to import and only needed to sync
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# One fixed-size record per daily bar; the date is stored as days since 1970-01-01
+BAR_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8')
+])
+
+_EPOCH = date(1970, 1, 1)
+
+def to_day(value: date) -> int:
+    """Convert a date to the day number used in the store."""
+    return (value - _EPOCH).days
+
+def from_day(day: int) -> date:
+    """Convert a stored day number back to a date."""
+    return date.fromordinal(_EPOCH.toordinal() + int(day))
+
+def market_today(symbol: str) -> date:
+    """Current date in the timezone of the symbol's market, which is how bars are dated."""
+    calendar = market_calendar.get_calendar(market_calendar.market_for_symbol(symbol))
+    return datetime.now(calendar.tz).date() if calendar else date.today()
+
+class HistoryStore:
+    """
+    Local append-only store of daily OHLCV bars, one binary file per symbol.
+
+    Files are memory-mapped for reads, so last-close and range lookups are a
+    binary search over the date column instead of a download. Only completed
+    sessions are stored, and a sync downloads just the days after the last
+    stored bar. A symbol whose sync failed is not synced again for
+    failure_ttl seconds.
+    """
+
+    def __init__(self, root: str, initial_period: str = '1y', failure_ttl: float = 300):
+        self.root = root
+        self.initial_period = initial_period
+        self.failure_ttl = failure_ttl
+        self._maps: Dict[str, tuple] = {}  # symbol -> (file size, memmap)
+        self._synced: Dict[str, date] = {}
+        self._failed: Dict[str, float] = {}  # symbol -> monotonic time it may be synced again
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol.upper()}.bars")
+
+    def bars(self, symbol: str) -> np.ndarray:
+        """Get all stored bars for a symbol, oldest first."""
+        symbol = symbol.upper()
+        path = self._path(symbol)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=BAR_DTYPE)
+        cached = self._maps.get(symbol)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        if size < BAR_DTYPE.itemsize:
+            return np.empty(0, dtype=BAR_DTYPE)
+        bars = np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(size // BAR_DTYPE.itemsize,))
+        self._maps[symbol] = (size, bars)
+        return bars
+
+    def last_date(self, symbol: str) -> Optional[date]:
+        bars = self.bars(symbol)
+        return from_day(bars['date'][-1]) if len(bars) else None
+
+    def append(self, symbol: str, bars: np.ndarray) -> int:
+        """
+        Append bars newer than the last stored one.
+
+        Returns:
+            int: Number of bars written
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            stored = self.bars(symbol)
+            if len(stored):
+                bars = bars[bars['date'] > stored['date'][-1]]
+            if not len(bars):
+                return 0
+            bars = np.sort(bars.astype(BAR_DTYPE), order='date')
+            path = self._path(symbol)
+            # A write cut short (crash, full disk) leaves a partial record that
+            # bars() ignores; drop it so new records stay aligned
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            if size % BAR_DTYPE.itemsize:
+                logger.warning(f"Truncating partial record at the end of {path}")
+                os.truncate(path, size - size % BAR_DTYPE.itemsize)
+            with open(path, 'ab') as f:
+                f.write(bars.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            return len(bars)
+
+    def sync(self, symbol: str, force: bool = False) -> int:
+        """
+        Download and store the completed sessions missing for a symbol.
+
+        Each symbol is synced at most once per day, and not within
+        failure_ttl seconds of a failed sync, unless force is set.
+
+        Returns:
+            int: Number of bars added
+        """
+        symbol = symbol.upper()
+        today = market_today(symbol)
+        if not force and (self._synced.get(symbol) == today or self._recently_failed(symbol)):
+            return 0
+
+        last = self.last_date(symbol)
+        try:
+            import yfinance as yf
+            get_limiter('yahoo').acquire()
+            ticker = yf.Ticker(symbol)
+            if last is None:
+                with upstream_call('yahoo', 'history'):
+                    data = ticker.history(period=self.initial_period)
+            else:
+                start = from_day(to_day(last) + 1)
+                if start >= today:
+                    self._synced[symbol] = today
+                    return 0
+                with upstream_call('yahoo', 'history'):
+                    data = ticker.history(start=start.isoformat())
+        except Exception as e:
+            logger.error(f"Error syncing history for {symbol}: {str(e)}")
+            self._failed[symbol] = time.monotonic() + self.failure_ttl
+            return 0
+
+        added = self.append(symbol, self._frame_to_bars(data, symbol))
+        self._synced[symbol] = today
+        self._failed.pop(symbol, None)
+        if added:
+            logger.info(f"Stored {added} new daily bars for {symbol}")
+        return added
+
+    def sync_batch(self, symbols: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Sync many symbols with one multi-ticker download per distinct start date.
+
+        Symbols with nothing stored yet download initial_period; the others
+        download from the day after their last stored bar. Callers get the
+        fewest requests by passing symbols whose stores end on the same day.
+
+        Returns:
+            Dict[str, Optional[int]]: Bars added per symbol, or None if its
+            download failed or returned no data
+        """
+        import pandas as pd
+        import yfinance as yf
+
+        groups: Dict[Optional[date], List[str]] = {}
+        results: Dict[str, Optional[int]] = {}
+        for symbol in dict.fromkeys(s.upper() for s in symbols):
+            last = self.last_date(symbol)
+            start = from_day(to_day(last) + 1) if last else None
+            if start is not None and start >= market_today(symbol):
+                self._synced[symbol] = market_today(symbol)
+                results[symbol] = 0
+            else:
+                groups.setdefault(start, []).append(symbol)
+
+        for start, group in groups.items():
+            window = {'start': start.isoformat()} if start else {'period': self.initial_period}
+            try:
+                get_limiter('yahoo').acquire()
+                # yfinance.download is not thread-safe; each call already fetches its tickers in parallel
+                with get_upstream_lock('yahoo.download'), upstream_call('yahoo', 'download'):
+                    # auto_adjust matches the prices Ticker.history stores in sync()
+                    data = yf.download(
+                        tickers=' '.join(group),
+                        group_by='ticker',
+                        auto_adjust=True,
+                        threads=True,
+                        progress=False,
+                        **window
+                    )
+            except Exception as e:
+                logger.error(f"Error syncing history for {len(group)} symbols: {str(e)}")
+                results.update(dict.fromkeys(group))
+                retry_at = time.monotonic() + self.failure_ttl
+                self._failed.update(dict.fromkeys(group, retry_at))
+                continue
+
+            for symbol in group:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        results[symbol] = None
+                        continue
+                    frame = data[symbol].dropna(how='all')
+                else:
+                    frame = data  # Single ticker downloads are not grouped
+                if frame.empty and start is None:
+                    results[symbol] = None
+                    continue
+                results[symbol] = self.append(symbol, self._frame_to_bars(frame, symbol))
+                self._synced[symbol] = market_today(symbol)
+                self._failed.pop(symbol, None)
+        return results
+
+    def _recently_failed(self, symbol: str) -> bool:
+        retry_at = self._failed.get(symbol)
+        if retry_at is None:
+            return False
+        if time.monotonic() < retry_at:
+            return True
+        self._failed.pop(symbol, None)
+        return False
+
+    @staticmethod
+    def _frame_to_bars(data: 'pd.DataFrame', symbol: str) -> np.ndarray:
+        if data is None or data.empty:
+            return np.empty(0, dtype=BAR_DTYPE)
+        index = data.index
+        # Today's bar is still forming; only completed sessions are stored. Daily
+        # bars are dated in the exchange's timezone, which may not be the server's.
+        session_today = market_today(symbol)
+        dates = np.array([to_day(ts.date()) for ts in index], dtype='<i4')
+        bars = np.empty(len(data), dtype=BAR_DTYPE)
+        bars['date'] = dates
+        for field, column in (('open', 'Open'), ('high', 'High'), ('low', 'Low'), ('close', 'Close'), ('volume', 'Volume')):
+            bars[field] = data[column].to_numpy(dtype='f8')
+        bars = bars[(bars['date'] < to_day(session_today)) & ~np.isnan(bars['close'])]
+        return bars
+
+    def history(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """Get stored bars with start <= date < end."""
+        bars = self.bars(symbol)
+        lo = np.searchsorted(bars['date'], to_day(start)) if start else 0
+        hi = np.searchsorted(bars['date'], to_day(end)) if end else len(bars)
+        return bars[lo:hi]
+
+    def last_close(self, symbol: str, before: Optional[date] = None, sync: bool = True) -> Optional[float]:
+        """
+        Get the last closed price of a symbol from the local store.
+
+        Args:
+            symbol (str): The stock symbol
+            before (date): Only consider sessions before this date (default: today in
+                the symbol's market timezone)
+            sync (bool): Fetch missing sessions first (at most once per day)
+
+        Returns:
+            Optional[float]: The closing price, or None if nothing is stored
+        """
+        if sync:
+            self.sync(symbol)
+        bars = self.bars(symbol)
+        index = np.searchsorted(bars['date'], to_day(before or market_today(symbol)))
+        if index == 0:
+            return None
+        return float(bars['close'][index - 1])
+
+history_store = HistoryStore(
+    os.getenv('HISTORY_STORE_DIR', 'history'),
+    failure_ttl=float(os.getenv('HISTORY_SYNC_FAILURE_TTL', 300))
+)
@@ -0,0 +1,145 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drop warnings and errors once a logger exceeds its budget.
+
+    Each logger gets a token bucket of `burst` records refilled at `rate`
+    per second, so a loop logging the same fallback for every holding can't
+    flood the log. The next record let through reports how many were
+    dropped. Records below WARNING are never limited.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, List[float]] = {}  # logger -> [tokens, updated, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} [{suppressed} similar messages suppressed]"
+            record.args = None
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps tracebacks apart from the message, so JsonFormatter can emit them as a field."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_traceback_formatter = logging.Formatter()
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+def configure_logging(log_file: Optional[str] = None, level: Optional[str] = None, json_format: Optional[bool] = None, console: Optional[bool] = None) -> None:
+    """
+    Route all logging through a queue drained by one background writer thread.
+
+    Callers only pay for putting a record on a queue; formatting and file or
+    console I/O happen on the listener thread. Safe to call more than once:
+    only the first call installs handlers, so modules never stack duplicate
+    FileHandlers on the root logger.
+
+    Args:
+        log_file (str): Log file path (LOG_FILE, default click_trader_log.txt)
+        level (str): Root log level (LOG_LEVEL, default INFO)
+        json_format (bool): Write JSON lines instead of text (LOG_FORMAT=json)
+        console (bool): Also write to stderr (LOG_CONSOLE, default true)
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        log_file = log_file or os.getenv('LOG_FILE', 'click_trader_log.txt')
+        level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+        if json_format is None:
+            json_format = os.getenv('LOG_FORMAT', 'text').lower() == 'json'
+        if console is None:
+            console = os.getenv('LOG_CONSOLE', 'true').lower() == 'true'
+
+        formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+        handlers = [logging.FileHandler(log_file)]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter(
+            rate=float(os.getenv('LOG_RATE_LIMIT', 5)),
+            burst=int(os.getenv('LOG_RATE_BURST', 20))
+        ))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+HOLIDAYS_FILE = os.getenv(
+    'MARKET_HOLIDAYS_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'market_holidays.json')
+)
+
+Instant = Union[None, float, datetime]
+
+def _timestamp(at: Instant) -> float:
+    if at is None:
+        return time.time()
+    if isinstance(at, datetime):
+        if at.tzinfo is None:
+            raise ValueError('datetime passed to the market calendar must be timezone-aware')
+        return at.timestamp()
+    return float(at)
+
+def _parse_time(value: str) -> Tuple[int, int]:
+    hour, minute = value.split(':')
+    return int(hour), int(minute)
+
+class MarketCalendar:
+    """
+    Trading sessions of a single market.
+
+    Session open and close instants are precomputed per calendar year into
+    two sorted lists of epoch seconds, so is_open, next_open and next_close
+    are a bisect over those lists instead of timezone arithmetic per call.
+    Years outside the bundled holiday data are built on demand with
+    weekends as the only closures.
+    """
+
+    def __init__(self, name: str, timezone: str, open_time: str, close_time: str,
+                 early_close_time: Optional[str] = None, holidays: List[str] = (),
+                 early_closes: List[str] = ()):
+        self.name = name
+        self.tz = pytz.timezone(timezone)
+        self.open_time = _parse_time(open_time)
+        self.close_time = _parse_time(close_time)
+        self.early_close_time = _parse_time(early_close_time) if early_close_time else self.close_time
+        self.holidays = {date.fromisoformat(d) for d in holidays}
+        self.early_closes = {date.fromisoformat(d) for d in early_closes}
+        self.known_years = {d.year for d in self.holidays | self.early_closes}
+        # (opens, closes) swapped as one tuple so readers never see a half-built year
+        self._sessions: Tuple[List[float], List[float]] = ([], [])
+        self._years = set()
+        # Span of the last year looked up, checked before any timezone work
+        self._window = (0.0, 0.0)
+        self._lock = threading.Lock()
+        for year in sorted(self.known_years):
+            self._build_year(year)
+
+    def _localize(self, day: date, hour_minute: Tuple[int, int]) -> float:
+        return self.tz.localize(datetime(day.year, day.month, day.day, *hour_minute)).timestamp()
+
+    def _build_year(self, year: int) -> None:
+        if year not in self.known_years:
+            logger.warning(f"No holiday data for {self.name} {year}; treating every weekday as a trading day")
+        sessions = []
+        day = date(year, 1, 1)
+        while day.year == year:
+            if day.weekday() < 5 and day not in self.holidays:
+                close = self.early_close_time if day in self.early_closes else self.close_time
+                sessions.append((self._localize(day, self.open_time), self._localize(day, close)))
+            day += timedelta(days=1)
+
+        # Years are built in arbitrary order, so merge rather than append
+        merged = sorted(list(zip(*self._sessions)) + sessions)
+        self._sessions = ([s[0] for s in merged], [s[1] for s in merged])
+        self._years.add(year)
+
+    def _lookup(self, ts: float) -> Tuple[List[float], List[float]]:
+        window_start, window_end = self._window
+        if window_start <= ts < window_end:
+            return self._sessions
+        # Cover the year of ts and the next one so next_open/next_close can
+        # always look across a year boundary
+        year = datetime.fromtimestamp(ts, self.tz).year
+        with self._lock:
+            for y in (year, year + 1):
+                if y not in self._years:
+                    self._build_year(y)
+            self._window = (self._localize(date(year, 1, 1), (0, 0)), self._localize(date(year + 1, 1, 1), (0, 0)))
+        return self._sessions
+
+    def is_open(self, at: Instant = None) -> bool:
+        """
+        Check whether the market is in a trading session.
+
+        Args:
+            at: Epoch seconds or an aware datetime; defaults to now
+
+        Returns:
+            bool: True if the market is open at that instant
+        """
+        ts = _timestamp(at)
+        opens, closes = self._lookup(ts)
+        i = bisect_right(opens, ts) - 1
+        return i >= 0 and ts < closes[i]
+
+    def next_open(self, at: Instant = None) -> Optional[datetime]:
+        """Start of the first session opening after the given instant, in market time."""
+        ts = _timestamp(at)
+        opens, _ = self._lookup(ts)
+        i = bisect_right(opens, ts)
+        return datetime.fromtimestamp(opens[i], self.tz) if i < len(opens) else None
+
+    def next_close(self, at: Instant = None) -> Optional[datetime]:
+        """End of the current session, or of the next one if closed, in market time."""
+        ts = _timestamp(at)
+        _, closes = self._lookup(ts)
+        i = bisect_right(closes, ts)
+        return datetime.fromtimestamp(closes[i], self.tz) if i < len(closes) else None
+
+    def next_transition(self, at: Instant = None) -> Optional[float]:
+        """
+        Get the next open or close after the given instant, whichever is sooner.
+
+        Returns:
+            Optional[float]: Epoch seconds of the transition, or None past the calendar
+        """
+        ts = _timestamp(at)
+        opens, closes = self._lookup(ts)
+        i_open = bisect_right(opens, ts)
+        i_close = bisect_right(closes, ts)
+        candidates = []
+        if i_open < len(opens):
+            candidates.append(opens[i_open])
+        if i_close < len(closes):
+            candidates.append(closes[i_close])
+        return min(candidates) if candidates else None
+
+    def session(self, day: date) -> Optional[Tuple[datetime, datetime]]:
+        """
+        Get the open and close of the session on a market-local date.
+
+        Returns:
+            Optional[Tuple[datetime, datetime]]: (open, close) in market time,
+            or None if the market does not trade that day
+        """
+        start = self._localize(day, (0, 0))
+        opens, closes = self._lookup(start)
+        i = bisect_right(opens, start)
+        if i < len(opens):
+            opened = datetime.fromtimestamp(opens[i], self.tz)
+            if opened.date() == day:
+                return opened, datetime.fromtimestamp(closes[i], self.tz)
+        return None
+
+    def last_session(self, before: date) -> Optional[date]:
+        """Get the last trading day strictly before a market-local date."""
+        for days_back in range(1, 15):
+            day = before - timedelta(days=days_back)
+            if self.session(day) is not None:
+                return day
+        return None
+
+    def regular_hours(self, day: date) -> Tuple[datetime, datetime]:
+        """Scheduled open and close on a date, ignoring holidays and early closes."""
+        return (
+            self.tz.localize(datetime(day.year, day.month, day.day, *self.open_time)),
+            self.tz.localize(datetime(day.year, day.month, day.day, *self.close_time))
+        )
+
+def load_calendars(path: str = HOLIDAYS_FILE) -> Dict[str, MarketCalendar]:
+    """
+    Build a calendar per market from the bundled holiday file.
+
+    A market declaring "same_as" reuses the other market's sessions and
+    holidays under its own name.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    calendars = {}
+    for market, spec in data.items():
+        if 'same_as' in spec:
+            spec = dict(data[spec['same_as']], name=spec['name'])
+        calendars[market] = MarketCalendar(
+            name=spec['name'],
+            timezone=spec['timezone'],
+            open_time=spec['open'],
+            close_time=spec['close'],
+            early_close_time=spec.get('early_close'),
+            holidays=spec.get('holidays', []),
+            early_closes=spec.get('early_closes', [])
+        )
+    return calendars
+
+_calendars: Optional[Dict[str, MarketCalendar]] = None
+_calendars_lock = threading.Lock()
+
+def get_calendar(market: str) -> Optional[MarketCalendar]:
+    """Get the calendar for a market code (asx, nyse, nasdaq), or None if unknown."""
+    global _calendars
+    if _calendars is None:
+        with _calendars_lock:
+            if _calendars is None:
+                _calendars = load_calendars()
+    return _calendars.get(market.lower())
+
+def is_open(market: str, at: Instant = None) -> bool:
+    calendar = get_calendar(market)
+    return calendar.is_open(at) if calendar else False
+
+def next_open(market: str, at: Instant = None) -> Optional[datetime]:
+    calendar = get_calendar(market)
+    return calendar.next_open(at) if calendar else None
+
+def next_close(market: str, at: Instant = None) -> Optional[datetime]:
+    calendar = get_calendar(market)
+    return calendar.next_close(at) if calendar else None
+
+def next_transition(market: str, at: Instant = None) -> Optional[float]:
+    calendar = get_calendar(market)
+    return calendar.next_transition(at) if calendar else None
+
+def last_session(market: str, before: Optional[date] = None) -> Optional[date]:
+    """Last trading day before a date (default: today in the market's timezone)."""
+    calendar = get_calendar(market)
+    if calendar is None:
+        return None
+    return calendar.last_session(before or datetime.now(calendar.tz).date())
+
+def seconds_until_transition(market: str, at: Instant = None) -> Optional[float]:
+    """Seconds until the market next opens or closes, or None for unknown markets."""
+    ts = _timestamp(at)
+    boundary = next_transition(market, ts)
+    return boundary - ts if boundary is not None else None
+
+def market_for_symbol(symbol: str) -> str:
+    """Market code a ticker trades on, judged by its exchange suffix."""
+    return 'asx' if symbol.upper().endswith('.AX') else 'nyse'
+
+class SessionCache:
+    """
+    Memoizes values that only change when a market opens or closes.
+
+    Each entry expires exactly at its market's next session boundary, so
+    reads in between are a dictionary lookup.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple, Tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, market: str, key: Tuple, build: Callable[[], object]):
+        """
+        Get the cached value for (market, key), building it with build() if expired.
+
+        Args:
+            market (str): Market whose session boundaries decide the expiry
+            key (Tuple): Any further cache key parts (e.g. user timezone)
+            build: Callable producing the value for the current session state
+        """
+        now = time.time()
+        cache_key = (market,) + tuple(key)
+        entry = self._entries.get(cache_key)
+        if entry is not None and now < entry[0]:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        expires = next_transition(market, now)
+        value = build()
+        # Don't keep a value built across a boundary; it may describe either side
+        if expires is not None and time.time() < expires:
+            with self._lock:
+                self._entries[cache_key] = (expires, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
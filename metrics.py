@@ -0,0 +1,179 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers fast DB queries up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Cache lookups are microseconds on a hit; a miss includes the load
+CACHE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """
+    Latency histogram with a fixed set of labels.
+
+    Each label combination keeps cumulative-ready bucket counts, a sum and a
+    count, which is all the Prometheus histogram format needs.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+class MetricsRegistry:
+    """
+    Histograms plus gauges read from existing stats() methods at scrape time.
+    """
+
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._stats: List[Tuple[str, Callable[[], Dict], Optional[str]]] = []
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labelnames, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def register_stats(self, prefix: str, collect: Callable[[], Dict], label: Optional[str] = None) -> None:
+        """
+        Expose a stats() dictionary as gauges named <prefix>_<key>.
+
+        Args:
+            prefix (str): Metric name prefix
+            collect: Callable returning {key: number}, or {label value: {key: number}}
+                when label is given
+            label (str): Label name for the outer keys of a nested dictionary
+        """
+        self._stats.append((prefix, collect, label))
+
+    def _render_stats(self) -> Iterable[str]:
+        gauges: Dict[str, List[str]] = {}
+        for prefix, collect, label in self._stats:
+            try:
+                stats = collect()
+            except Exception:
+                continue
+            groups = stats.items() if label else [(None, stats)]
+            for label_value, values in groups:
+                for key, value in values.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if not isinstance(value, (int, float)):
+                        continue
+                    name = f"{prefix}_{key}"
+                    labels = _format_labels((label,), (label_value,)) if label else ''
+                    gauges.setdefault(name, []).append(f"{name}{labels} {_format_value(value)}")
+        for name, samples in gauges.items():
+            yield f"# TYPE {name} gauge"
+            yield from samples
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        lines.extend(self._render_stats())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+request_latency = registry.histogram(
+    'clicktrader_http_request_duration_seconds',
+    'Flask request latency by route',
+    ('method', 'route', 'status')
+)
+upstream_latency = registry.histogram(
+    'clicktrader_upstream_call_duration_seconds',
+    'Latency of calls to market data and broker APIs',
+    ('provider', 'call', 'outcome')
+)
+db_query_latency = registry.histogram(
+    'clicktrader_db_query_duration_seconds',
+    'Database statement latency by statement type',
+    ('operation',)
+)
+cache_lookup_latency = registry.histogram(
+    'clicktrader_cache_lookup_duration_seconds',
+    'Cache lookup latency; misses include loading the value',
+    ('cache', 'result'),
+    buckets=CACHE_BUCKETS
+)
+
+@contextmanager
+def upstream_call(provider: str, call: str):
+    """Time an upstream API call, labelling it ok or error."""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        upstream_latency.observe(time.perf_counter() - start, provider, call, outcome)
+
+class InstrumentedClient:
+    """Proxy that times every method call on an API client as an upstream call."""
+
+    def __init__(self, client, provider: str):
+        self._client = client
+        self._provider = provider
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            with upstream_call(self._provider, name):
+                return attr(*args, **kwargs)
+        return timed
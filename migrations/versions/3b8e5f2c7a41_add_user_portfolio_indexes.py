@@ -0,0 +1,28 @@
+"""Add user_portfolio indexes
+
+Revision ID: 3b8e5f2c7a41
+Revises: 6fc1dc06d6af
+Create Date: 2026-10-16 09:12:44.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e5f2c7a41'
+down_revision = '6fc1dc06d6af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_portfolio', schema=None) as batch_op:
+        batch_op.create_index('ix_user_portfolio_user_id_symbol', ['user_id', 'symbol'], unique=False)
+        batch_op.create_index('ix_user_portfolio_symbol', ['symbol'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_portfolio', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_portfolio_symbol')
+        batch_op.drop_index('ix_user_portfolio_user_id_symbol')
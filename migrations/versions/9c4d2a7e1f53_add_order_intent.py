@@ -0,0 +1,48 @@
+"""Add order intent table
+
+Revision ID: 9c4d2a7e1f53
+Revises: 3b8e5f2c7a41
+Create Date: 2026-10-16 11:47:03.271905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4d2a7e1f53'
+down_revision = '3b8e5f2c7a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_intent',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('client_order_id', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('symbol', sa.String(length=10), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('platform', sa.String(length=10), nullable=False),
+        sa.Column('portfolio_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('client_order_id')
+    )
+    with op.batch_alter_table('order_intent', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_order_intent_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_order_intent_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order_intent', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_order_intent_user_id'))
+        batch_op.drop_index(batch_op.f('ix_order_intent_status'))
+
+    op.drop_table('order_intent')
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from rate_limiter import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Order intent lifecycle: pending -> submitting -> submitted | failed
+PENDING = 'pending'
+SUBMITTING = 'submitting'
+SUBMITTED = 'submitted'
+FAILED = 'failed'
+
+def make_client_order_id(user_id: int, symbol: str, quantity: int, nonce: str) -> str:
+    """
+    Build a deterministic client order ID for an order intent.
+
+    The same user, symbol, signed quantity and nonce always give the same ID,
+    so a retried submission is recognised as a duplicate both here and by
+    the broker.
+    """
+    digest = hashlib.sha256(f"{user_id}:{symbol.upper()}:{quantity}:{nonce}".encode()).hexdigest()
+    return f"ct-{digest[:32]}"
+
+class OrderDispatcher:
+    """
+    Persists order intents and submits them to brokers from a worker pool.
+
+    Web requests only record the intent and return; workers claim pending
+    intents, submit them with their client order ID, and record each status
+    transition back to the database. A claim holds a lease: only the worker
+    whose claim is still current may finish the intent, and another process
+    only takes it back once the lease has expired.
+    """
+
+    def __init__(self, app, db, model, submit_order: Callable, on_submitted: Optional[Callable] = None,
+                 workers: int = 4, max_attempts: int = 3, lease_timeout: float = 300):
+        """
+        Args:
+            app: Flask application used for the database context
+            db: Flask-SQLAlchemy instance
+            model: OrderIntent model
+            submit_order: Callable taking an intent and returning True when the broker accepted it
+            on_submitted: Optional callable run with the intent in the same transaction
+                that marks it submitted (e.g. to update the portfolio)
+            workers (int): Number of submission threads
+            max_attempts (int): Broker submission attempts before an intent fails
+            lease_timeout (float): Seconds after which a submitting intent is
+                presumed abandoned by its worker and may be recovered
+        """
+        self.app = app
+        self.db = db
+        self.model = model
+        self.submit_order = submit_order
+        self.on_submitted = on_submitted
+        self.max_attempts = max_attempts
+        self.lease_timeout = lease_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='orders')
+
+    def enqueue(self, user_id: int, symbol: str, quantity: int, price: float, platform: str,
+                nonce: str, portfolio_id: Optional[int] = None) -> Tuple[object, bool]:
+        """
+        Record an order intent and schedule its submission.
+
+        Returns:
+            tuple: (intent, created) where created is False if the same
+            intent had already been recorded
+        """
+        client_order_id = make_client_order_id(user_id, symbol, quantity, nonce)
+        session = self.db.session
+        existing = self.model.query.filter_by(client_order_id=client_order_id).first()
+        if existing is not None:
+            return existing, False
+
+        intent = self.model(
+            client_order_id=client_order_id,
+            user_id=user_id,
+            symbol=symbol.upper(),
+            quantity=quantity,
+            price=price,
+            platform=platform,
+            portfolio_id=portfolio_id,
+            status=PENDING
+        )
+        session.add(intent)
+        try:
+            session.commit()
+        except IntegrityError:
+            # A concurrent request recorded the same intent first
+            session.rollback()
+            return self.model.query.filter_by(client_order_id=client_order_id).first(), False
+
+        self.executor.submit(self._dispatch, intent.id)
+        logger.info(f"Queued order {client_order_id}: {quantity} {intent.symbol} via {platform}")
+        return intent, True
+
+    def recover(self) -> int:
+        """
+        Re-schedule pending intents and submitting ones whose lease has expired.
+
+        Other live processes may be submitting intents right now, so only
+        submitting intents untouched for lease_timeout seconds are taken
+        back. Resubmitting those is safe because the broker rejects duplicate
+        client order IDs.
+        """
+        with self.app.app_context():
+            now = datetime.utcnow()
+            self.model.query.filter(
+                self.model.status == SUBMITTING,
+                self.model.updated_at < now - timedelta(seconds=self.lease_timeout)
+            ).update({'status': PENDING, 'updated_at': now}, synchronize_session=False)
+            self.db.session.commit()
+            ids = [row.id for row in self.db.session.query(self.model.id).filter_by(status=PENDING)]
+        for intent_id in ids:
+            self.executor.submit(self._dispatch, intent_id)
+        if ids:
+            logger.info(f"Recovered {len(ids)} unfinished order intents")
+        return len(ids)
+
+    def _claim(self, intent_id: int) -> Optional[datetime]:
+        """Move an intent out of pending; returns the claim time, or None if another worker won."""
+        claimed_at = datetime.utcnow()
+        claimed = self.model.query.filter_by(id=intent_id, status=PENDING).update(
+            {'status': SUBMITTING, 'updated_at': claimed_at},
+            synchronize_session=False
+        )
+        self.db.session.commit()
+        return claimed_at if claimed == 1 else None
+
+    def _dispatch(self, intent_id: int) -> None:
+        with self.app.app_context():
+            session = self.db.session
+            try:
+                claimed_at = self._claim(intent_id)
+                if claimed_at is None:
+                    return
+                intent = session.get(self.model, intent_id)
+                attempts = intent.attempts or 0
+                error = None
+                accepted = False
+                for attempt in range(self.max_attempts):
+                    attempts += 1
+                    try:
+                        accepted = bool(self.submit_order(intent))
+                        error = None if accepted else 'Rejected by broker'
+                    except Exception as e:
+                        error = str(e)
+                    if accepted:
+                        break
+                    logger.warning(f"Order {intent.client_order_id} attempt {attempt + 1}/{self.max_attempts} failed: {error}")
+                    if attempt < self.max_attempts - 1:
+                        time.sleep(backoff_delay(attempt))
+
+                # Finish only if our claim is still current; a recovered intent
+                # belongs to whichever worker claimed it last
+                status = SUBMITTED if accepted else FAILED
+                finished = self.model.query.filter_by(id=intent_id, status=SUBMITTING, updated_at=claimed_at).update(
+                    {'status': status, 'attempts': attempts, 'error': error[:255] if error else None,
+                     'updated_at': datetime.utcnow()},
+                    synchronize_session=False
+                )
+                if finished != 1:
+                    session.rollback()
+                    logger.warning(f"Order {intent.client_order_id} was taken over by another worker; leaving it to them")
+                    return
+                if accepted and self.on_submitted:
+                    self.on_submitted(intent)
+                session.commit()
+                logger.info(f"Order {intent.client_order_id} {status}")
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error dispatching order intent {intent_id}: {str(e)}")
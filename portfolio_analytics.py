@@ -0,0 +1,117 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+class PortfolioAnalytics:
+    """
+    Vectorized valuation of a user's positions.
+
+    Positions are loaded into NumPy arrays once and every metric (market
+    value, cost basis, unrealized and day P&L, weights, concentration) is
+    computed in a single pass over those arrays. Missing prices are NaN and
+    are left out of the totals.
+    """
+
+    def __init__(self, symbols: List[str], quantity: np.ndarray, purchase_price: np.ndarray,
+                 current_price: np.ndarray, last_close: np.ndarray):
+        self.symbols = symbols
+        self.quantity = quantity
+        self.purchase_price = purchase_price
+        self.current_price = current_price
+        self.last_close = last_close
+        self._compute()
+
+    @classmethod
+    def from_positions(cls, positions: Iterable, quotes: Dict[str, Dict]) -> 'PortfolioAnalytics':
+        """
+        Build the analytics from portfolio rows and quotes.
+
+        Args:
+            positions: Objects with symbol, quantity and purchase_price attributes
+            quotes (Dict[str, Dict]): Quote per upper-cased symbol with
+                'current_price' and 'last_closed_price'
+        """
+        positions = list(positions)
+        symbols = [p.symbol.upper() for p in positions]
+        count = len(positions)
+        quantity = np.fromiter((p.quantity for p in positions), dtype='f8', count=count)
+        purchase_price = np.fromiter((p.purchase_price for p in positions), dtype='f8', count=count)
+        current_price = np.fromiter((_price(quotes.get(s), 'current_price') for s in symbols), dtype='f8', count=count)
+        last_close = np.fromiter((_price(quotes.get(s), 'last_closed_price') for s in symbols), dtype='f8', count=count)
+        return cls(symbols, quantity, purchase_price, current_price, last_close)
+
+    def _compute(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.market_value = self.quantity * self.current_price
+            self.cost_basis = self.quantity * self.purchase_price
+            self.unrealized_pnl = self.market_value - self.cost_basis
+            self.price_change = (self.current_price - self.purchase_price) / self.purchase_price * 100
+            self.day_pnl = self.quantity * (self.current_price - self.last_close)
+
+            priced = ~np.isnan(self.market_value)
+            self.total_market_value = float(self.market_value[priced].sum())
+            self.total_cost_basis = float(self.cost_basis.sum())
+            self.total_priced_cost = float(self.cost_basis[priced].sum())
+            self.total_unrealized_pnl = float(self.unrealized_pnl[priced].sum())
+            self.total_day_pnl = float(np.nansum(self.day_pnl))
+            self.priced_count = int(priced.sum())
+
+            if self.total_market_value:
+                self.weight = np.where(priced, self.market_value / self.total_market_value, np.nan)
+                # Concentration is measured per symbol, so several lots count as one holding
+                names, codes = np.unique(np.asarray(self.symbols, dtype=object), return_inverse=True)
+                symbol_weights = np.bincount(codes, weights=np.nan_to_num(self.weight), minlength=len(names))
+                self.hhi = float(np.square(symbol_weights).sum())
+                top = int(symbol_weights.argmax())
+                self.top_symbol = str(names[top])
+                self.top_weight = float(symbol_weights[top])
+            else:
+                self.weight = np.full(len(self.symbols), np.nan)
+                self.hhi = None
+                self.top_symbol = None
+                self.top_weight = None
+
+    def summary(self) -> Dict:
+        """Portfolio-level totals and concentration."""
+        previous_value = self.total_market_value - self.total_day_pnl
+        return {
+            'positions': len(self.symbols),
+            'priced_positions': self.priced_count,
+            'market_value': self.total_market_value,
+            'cost_basis': self.total_cost_basis,
+            'unrealized_pnl': self.total_unrealized_pnl,
+            'unrealized_pnl_percent': self.total_unrealized_pnl / self.total_priced_cost * 100 if self.total_priced_cost else None,
+            'day_pnl': self.total_day_pnl,
+            'day_pnl_percent': self.total_day_pnl / previous_value * 100 if previous_value else None,
+            'hhi': self.hhi,
+            'effective_positions': 1 / self.hhi if self.hhi else None,
+            'top_symbol': self.top_symbol,
+            'top_weight': self.top_weight
+        }
+
+    def positions(self) -> List[Dict]:
+        """Per-position metrics, in input order, with NaN reported as None."""
+        columns = {
+            'quantity': self.quantity,
+            'purchase_price': self.purchase_price,
+            'current_price': self.current_price,
+            'last_close': self.last_close,
+            'market_value': self.market_value,
+            'cost_basis': self.cost_basis,
+            'unrealized_pnl': self.unrealized_pnl,
+            'price_change': self.price_change,
+            'day_pnl': self.day_pnl,
+            'weight': self.weight
+        }
+        lists = {name: _nan_to_none(values) for name, values in columns.items()}
+        return [
+            dict({'symbol': symbol}, **{name: values[i] for name, values in lists.items()})
+            for i, symbol in enumerate(self.symbols)
+        ]
+
+def _price(quote: Optional[Dict], field: str) -> float:
+    value = quote.get(field) if quote else None
+    return float(value) if value else np.nan
+
+def _nan_to_none(values: np.ndarray) -> List:
+    return [None if v != v else v for v in values.tolist()]
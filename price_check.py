@@ -1,32 +1,137 @@
-import yfinance as yf
-import pandas as pd
-from price_utils import get_asx_stocks
+"""
+Bring the local closing-price history up to date for a whole market.
 
-def fetch_last_closing_prices():
+Usage:
+    python price_check.py [--market asx] [--symbols BHP.AX,CBA.AX]
+                          [--workers 4] [--batch-size 100] [--force] [--print]
+
+Symbols whose store already holds the market's last completed session are
+skipped, so a rerun after a partial failure only fetches what is missing.
+The rest are downloaded in multi-ticker batches and appended to the history
+store, which writes whole records at a time. yfinance runs one download at a
+time, so workers overlap the store writes with the next batch's download. The
+exit status is 1 if any symbol failed.
+"""
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import Dict, List, Optional
+
+import market_calendar
+from history_store import history_store
+from logging_setup import configure_logging
+from symbol_universe import symbol_universe
+
+logger = logging.getLogger(__name__)
+
+def latest_session(symbol: str, market: Optional[str], sessions: Dict[str, Optional[date]]) -> Optional[date]:
+    """Last completed session the store can hold for a symbol (memoized per market)."""
+    market = market or market_calendar.market_for_symbol(symbol)
+    if market not in sessions:
+        sessions[market] = market_calendar.last_session(market)
+    return sessions[market]
+
+def stale_symbols(symbols: List[str], force: bool = False) -> List[str]:
+    """
+    Get the symbols missing their last completed session, ordered by last stored date.
+
+    Ordering by last stored date puts symbols needing the same download
+    window into the same batch.
+    """
+    sessions: Dict[str, Optional[date]] = {}
+    stale = []
+    for symbol in symbols:
+        last = history_store.last_date(symbol)
+        listing = symbol_universe.get(symbol)
+        expected = latest_session(symbol, listing.market if listing else None, sessions)
+        if force or last is None or expected is None or last < expected:
+            stale.append((last or date.min, symbol))
+    return [symbol for _, symbol in sorted(stale)]
+
+def fetch_last_closing_prices(symbols: List[str], workers: int = 4, batch_size: int = 100, force: bool = False) -> Dict:
     """
-    Fetch the last closing price for all sample US stocks and save them to a CSV file.
+    Sync the history store for many symbols in multi-ticker batches.
+
+    Args:
+        symbols (List[str]): Symbols to bring up to date
+        workers (int): Worker threads; they share one download at a time
+        batch_size (int): Symbols per multi-ticker download
+        force (bool): Fetch even symbols that look up to date
+
+    Returns:
+        Dict: Counts of symbols checked, skipped, synced and failed, bars
+        added, failed symbols, elapsed seconds and symbols per second
     """
-    stocks = get_asx_stocks()
-    prices = []
-
-    for stock in stocks:
-        symbol = stock['symbol']
-        try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period='1d')
-            if not hist.empty:
-                last_price = hist['Close'].iloc[-1]
-                prices.append({'Symbol': symbol, 'Last Closing Price': last_price})
-                print(f"{symbol}: {last_price}")
-            else:
-                print(f"No data found for {symbol}.")
-        except Exception as e:
-            print(f"Error fetching data for {symbol}: {e}")
-
-    # Create a DataFrame and save to CSV
-    df = pd.DataFrame(prices)
-    df.to_csv('last_closing_prices.csv', index=False)
-    print("Last closing prices saved to 'last_closing_prices.csv'.")
+    start = time.perf_counter()
+    stale = stale_symbols(symbols, force)
+    batches = [stale[i:i + batch_size] for i in range(0, len(stale), batch_size)]
+    logger.info(f"{len(stale)} of {len(symbols)} symbols need syncing ({len(batches)} batches, {workers} workers)")
+
+    synced, added, failed = 0, 0, []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(history_store.sync_batch, batch): batch for batch in batches}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Batch of {len(futures[future])} symbols failed: {str(e)}")
+                results = dict.fromkeys(futures[future])
+            for symbol, count in results.items():
+                if count is None:
+                    failed.append(symbol)
+                else:
+                    synced += 1
+                    added += count
+            logger.info(f"Batch {done}/{len(batches)} done: {synced} synced, {len(failed)} failed")
+
+    elapsed = time.perf_counter() - start
+    return {
+        'checked': len(symbols),
+        'skipped': len(symbols) - len(stale),
+        'synced': synced,
+        'failed': len(failed),
+        'bars_added': added,
+        'failed_symbols': sorted(failed),
+        'elapsed': elapsed,
+        'symbols_per_s': len(stale) / elapsed if elapsed else 0.0
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--market', default='asx', help="Market to sync (asx, nyse, nasdaq or all)")
+    parser.add_argument('--symbols', help='Comma-separated symbols to sync instead of a market')
+    parser.add_argument('--workers', type=int, default=4, help='Worker threads (downloads themselves run one at a time)')
+    parser.add_argument('--batch-size', type=int, default=100, help='Symbols per download')
+    parser.add_argument('--force', action='store_true', help='Fetch symbols even if they look up to date')
+    parser.add_argument('--print', action='store_true', dest='print_closes', help='Print the last close of every symbol')
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(',') if s.strip()]
+    else:
+        market = None if args.market.lower() == 'all' else args.market
+        symbols = [listing['symbol'] for listing in symbol_universe.listings(market)]
+
+    report = fetch_last_closing_prices(symbols, args.workers, args.batch_size, args.force)
+
+    if args.print_closes:
+        for symbol in symbols:
+            last_close = history_store.last_close(symbol, sync=False)
+            print(f"{symbol}: {last_close}" if last_close is not None else f"No data found for {symbol}.")
+
+    print(
+        f"Checked {report['checked']} symbols in {report['elapsed']:.1f}s: "
+        f"{report['skipped']} already up to date, {report['synced']} synced "
+        f"({report['bars_added']} bars, {report['symbols_per_s']:.1f} symbols/s), {report['failed']} failed"
+    )
+    if report['failed_symbols']:
+        print(f"Failed: {', '.join(report['failed_symbols'][:50])}" + (' ...' if report['failed'] > 50 else ''))
+    print(f"Closing prices stored in '{history_store.root}'.")
+    return 1 if report['failed'] else 0
 
 if __name__ == '__main__':
-    fetch_last_closing_prices() 
\ No newline at end of file
+    sys.exit(main())
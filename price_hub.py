@@ -0,0 +1,191 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class PriceFeed(ABC):
+    """
+    Interface for upstream price feeds driven by a PriceHub.
+
+    The hub calls subscribe/unsubscribe exactly once per symbol as interest
+    starts and ends, and the feed reports new quotes through the publish
+    callback handed to start().
+    """
+
+    @abstractmethod
+    def start(self, publish: Callable[[str, Dict], None]) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, symbol: str) -> None:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, symbol: str) -> None:
+        ...
+
+    def stop(self) -> None:
+        pass
+
+class PollingPriceFeed(PriceFeed):
+    """
+    Feed that polls a batch quote function for all subscribed symbols.
+
+    One background thread issues one batched lookup per interval, however
+    many consumers are watching each symbol.
+    """
+
+    def __init__(self, fetch_quotes: Callable[[List[str]], Dict[str, Dict]], interval: float = 5):
+        self.fetch_quotes = fetch_quotes
+        self.interval = interval
+        self._symbols = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._publish = None
+
+    def start(self, publish: Callable[[str, Dict], None]) -> None:
+        self._publish = publish
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='price-feed', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, symbol: str) -> None:
+        with self._lock:
+            self._symbols.add(symbol)
+        # Poll straight away so new symbols don't wait a whole interval
+        self._wake.set()
+
+    def unsubscribe(self, symbol: str) -> None:
+        with self._lock:
+            self._symbols.discard(symbol)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                symbols = sorted(self._symbols)
+            if symbols:
+                try:
+                    quotes = self.fetch_quotes(symbols)
+                    for symbol, quote in quotes.items():
+                        self._publish(symbol, quote)
+                except Exception as e:
+                    logger.error(f"Price feed poll failed for {len(symbols)} symbols: {str(e)}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+class Subscription:
+    """
+    One consumer's view of the hub.
+
+    Updates are coalesced per symbol, so a slow consumer only ever sees the
+    latest quote for each symbol rather than a growing backlog.
+    """
+
+    def __init__(self, hub: 'PriceHub', symbols: Iterable[str]):
+        self.hub = hub
+        self.symbols = frozenset(symbols)
+        self._pending: Dict[str, Dict] = {}
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def _put(self, symbol: str, quote: Dict) -> None:
+        with self._cond:
+            self._pending[symbol] = quote
+            self._cond.notify()
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Block until at least one update arrives or the timeout passes.
+
+        Returns:
+            Dict[str, Dict]: Latest quote per updated symbol, empty on timeout
+        """
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            updates, self._pending = self._pending, {}
+        return updates
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.hub.unsubscribe(self)
+
+class PriceHub:
+    """
+    Fan-in/fan-out hub between an upstream feed and many consumers.
+
+    Interest in each symbol is reference-counted across all subscriptions:
+    the feed is subscribed when the first consumer arrives, every update is
+    fanned out to all interested consumers, and the upstream subscription
+    is dropped when the last consumer leaves.
+    """
+
+    def __init__(self, feed: PriceFeed):
+        self.feed = feed
+        self._consumers: Dict[str, set] = {}
+        self._last: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, (symbol.upper() for symbol in symbols))
+        with self._lock:
+            if not self._started:
+                self.feed.start(self.publish)
+                self._started = True
+            for symbol in subscription.symbols:
+                consumers = self._consumers.setdefault(symbol, set())
+                if not consumers:
+                    self.feed.subscribe(symbol)
+                consumers.add(subscription)
+                # Prime new consumers with the latest known quote
+                if symbol in self._last:
+                    subscription._put(symbol, self._last[symbol])
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for symbol in subscription.symbols:
+                consumers = self._consumers.get(symbol)
+                if consumers is None:
+                    continue
+                consumers.discard(subscription)
+                if not consumers:
+                    del self._consumers[symbol]
+                    self._last.pop(symbol, None)
+                    self.feed.unsubscribe(symbol)
+
+    def publish(self, symbol: str, quote: Dict) -> None:
+        """Fan an upstream quote out to every consumer of the symbol if it changed."""
+        with self._lock:
+            consumers = self._consumers.get(symbol)
+            if not consumers or self._last.get(symbol) == quote:
+                return
+            self._last[symbol] = quote
+            consumers = list(consumers)
+            self.published += 1
+            self.delivered += len(consumers)
+        for subscription in consumers:
+            subscription._put(symbol, quote)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'symbols': len(self._consumers),
+                'consumers': sum(len(consumers) for consumers in self._consumers.values()),
+                'published': self.published,
+                'delivered': self.delivered
+            }
@@ -0,0 +1,91 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class PriceRefresher:
+    """
+    Background worker that keeps UserPortfolio.last_price / last_updated fresh.
+
+    Each cycle prices the distinct set of symbols held across all users once
+    and writes the results back in a single transaction, so page views can
+    read valuations from the database instead of calling upstream.
+    """
+
+    def __init__(self, app, db, model, fetch_quotes: Callable[[List[str]], Dict[str, Dict]], interval: float = 60):
+        """
+        Args:
+            app: Flask application used for the database context
+            db: Flask-SQLAlchemy instance
+            model: Portfolio model with symbol, last_price and last_updated columns
+            fetch_quotes: Callable returning {symbol: {'current_price': ...}} for upper-cased symbols
+            interval (float): Seconds between refresh cycles
+        """
+        self.app = app
+        self.db = db
+        self.model = model
+        self.fetch_quotes = fetch_quotes
+        self.interval = interval
+        self.last_run = None
+        self.last_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='price-refresher', daemon=True)
+        self._thread.start()
+        logger.info(f"Price refresher started with a {self.interval}s interval")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_once()
+            except Exception as e:
+                logger.error(f"Price refresh cycle failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def refresh_once(self) -> int:
+        """
+        Run one refresh cycle.
+
+        Returns:
+            int: Number of distinct symbols whose price was updated
+        """
+        with self.app.app_context():
+            session = self.db.session
+            held = [row[0] for row in session.query(self.model.symbol).distinct()]
+            if not held:
+                return 0
+
+            quotes = self.fetch_quotes([symbol.upper() for symbol in held])
+            now = datetime.utcnow()
+            updated = 0
+            try:
+                for symbol in held:
+                    quote = quotes.get(symbol.upper())
+                    if not quote or not quote.get('current_price'):
+                        continue
+                    session.query(self.model).filter(self.model.symbol == symbol).update(
+                        {'last_price': quote['current_price'], 'last_updated': now},
+                        synchronize_session=False
+                    )
+                    updated += 1
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+            self.last_run = now
+            self.last_count = updated
+            logger.info(f"Refreshed prices for {updated}/{len(held)} held symbols")
+            return updated
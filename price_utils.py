@@ -1,74 +1,360 @@
-import yfinance as yf
-import pandas as pd
-from datetime import datetime, timedelta
-import pytz
 import logging
-from typing import Dict, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+from collections import OrderedDict
 import json
 import os
 import time
+import threading
 from dotenv import load_dotenv
+from rate_limiter import backoff_delay, get_limiter, get_upstream_lock
+from metrics import cache_lookup_latency, upstream_call
+from history_store import history_store
+from fundamentals_cache import FundamentalsCache
+import market_calendar
+from symbol_universe import symbol_universe
+
+# yfinance and pandas take a long time to import; they're loaded on first fetch
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.getenv('LOG_FILE', 'click_trader_log.txt')),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-def get_stock_price(symbol: str, max_retries: int = 3) -> float:
+yahoo_limiter = get_limiter('yahoo')
+# yfinance.download collects results in module globals; overlapping calls drop tickers or never return
+yahoo_download_lock = get_upstream_lock('yahoo.download')
+
+class QuoteCache:
+    """
+    Process-wide quote cache with per-symbol TTLs, LRU eviction and
+    single-flight loading.
+
+    Concurrent lookups for a key that is not cached share one call to the
+    loader; every other caller waits for that result instead of going
+    upstream itself.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 15.0, name: str = 'quote'):
+        self.name = name
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._ttl_overrides: Dict[str, float] = {}
+        self._in_flight: Dict[Tuple, '_Flight'] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collapsed = 0
+
+    def set_ttl(self, symbol: str, ttl: float) -> None:
+        """Override the TTL used for every key of the given symbol."""
+        with self._lock:
+            self._ttl_overrides[symbol.upper()] = ttl
+
+    def ttl_for(self, symbol: str) -> float:
+        return self._ttl_overrides.get(symbol.upper(), self.default_ttl)
+
+    def get(self, key: Tuple):
+        """Return the cached value for key, or None if missing or expired, counting the hit or miss."""
+        start = time.perf_counter()
+        with self._lock:
+            value = self._get_locked(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        cache_lookup_latency.observe(time.perf_counter() - start, self.name, 'miss' if value is None else 'hit')
+        return value
+
+    def _get_locked(self, key: Tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_many(self, keys: List[Tuple]) -> Dict[Tuple, object]:
+        """Return the fresh cached values for keys, counting hits and misses."""
+        start = time.perf_counter()
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._get_locked(key)
+                if value is not None:
+                    found[key] = value
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        result = 'hit' if len(found) == len(keys) else 'miss' if not found else 'partial'
+        cache_lookup_latency.observe(time.perf_counter() - start, self.name, result)
+        return found
+
+    def set(self, key: Tuple, value, ttl: float) -> None:
+        with self._lock:
+            self._set_locked(key, value, ttl)
+
+    def _set_locked(self, key: Tuple, value, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key: Tuple, loader: Callable, ttl: Optional[float] = None):
+        """
+        Return the cached value for key, calling loader on a miss.
+
+        The first element of key is the symbol and drives the TTL lookup.
+        An explicit ttl takes precedence over the per-symbol TTL. A loader
+        result of None is handed back to the callers but not cached.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                cache_lookup_latency.observe(time.perf_counter() - start, self.name, 'hit')
+                return value
+            self.misses += 1
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            cache_lookup_latency.observe(time.perf_counter() - start, self.name, 'collapsed')
+            return flight.value
+
+        try:
+            flight.value = loader()
+        finally:
+            with self._lock:
+                if flight.value is not None:
+                    self._set_locked(key, flight.value, ttl if ttl is not None else self.ttl_for(key[0]))
+                del self._in_flight[key]
+            flight.done.set()
+            cache_lookup_latency.observe(time.perf_counter() - start, self.name, 'miss')
+        return flight.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'collapsed': self.collapsed
+            }
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+quote_cache = QuoteCache(
+    max_entries=int(os.getenv('QUOTE_CACHE_SIZE', 1024)),
+    default_ttl=float(os.getenv('QUOTE_CACHE_TTL', 15))
+)
+
+# Last closed prices only change once per session
+LAST_CLOSE_TTL = float(os.getenv('LAST_CLOSE_CACHE_TTL', 3600))
+# Quotes for a closed market only settle (closing auction, corrections)
+CLOSED_QUOTE_TTL = float(os.getenv('QUOTE_CLOSED_CACHE_TTL', 300))
+
+def _until_boundary(symbol: str, ttl: float) -> float:
+    """Cap a TTL so the cached value expires when the symbol's market opens or closes."""
+    remaining = market_calendar.seconds_until_transition(market_calendar.market_for_symbol(symbol))
+    return min(ttl, remaining) if remaining is not None else ttl
+
+def quote_ttl(symbol: str) -> float:
+    """TTL for a live quote: short while the market trades, longer while it is closed."""
+    if market_calendar.is_open(market_calendar.market_for_symbol(symbol)):
+        return _until_boundary(symbol, quote_cache.ttl_for(symbol))
+    return _until_boundary(symbol, max(CLOSED_QUOTE_TTL, quote_cache.ttl_for(symbol)))
+
+def fetch_yahoo_price(symbol: str) -> Optional[float]:
+    """
+    Get the latest price with a single Yahoo Finance request, bypassing the cache.
+
+    Callers wait for yahoo_limiter first, so the request budget is shared.
+
+    Returns:
+        Optional[float]: The price, or None if Yahoo has no data for the symbol
+
+    Raises:
+        Exception: Whatever the request raised, so callers can count failures
+    """
+    import yfinance as yf
+    stock = yf.Ticker(symbol)
+    # Get the most recent data
+    with upstream_call('yahoo', 'history'):
+        data = stock.history(period='1d')
+    if data.empty:
+        logger.warning(f"No data found for symbol {symbol}")
+        return None
+    return float(data['Close'].iloc[-1])
+
+def _fetch_stock_price(symbol: str, max_retries: int) -> Optional[float]:
+    for attempt in range(max_retries):
+        try:
+            # Wait for the shared Yahoo Finance request budget
+            yahoo_limiter.acquire()
+            return fetch_yahoo_price(symbol)
+        except Exception as e:
+            logger.error(f"Error getting price for {symbol} (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            if attempt < max_retries - 1:
+                time.sleep(backoff_delay(attempt))  # Wait before retrying
+    return None
+
+def get_stock_price(symbol: str, max_retries: int = 3, use_last_closed: bool = False) -> float:
     """
     Get the current stock price for a given symbol.
     
+    Prices are served from the shared quote cache when fresh, and last
+    closed prices from the local history store.
+    
     Args:
         symbol (str): The stock symbol to get the price for
         max_retries (int): Maximum number of retry attempts
+        use_last_closed (bool): Return the last closed price instead of the latest one
         
     Returns:
-        float: The current stock price
+        float: The current stock price, or 0.0 if it could not be fetched
     """
+    symbol = symbol.upper()
+    if use_last_closed:
+        # Closed sessions never change, so read them from the local history store
+        price = history_store.last_close(symbol)
+    else:
+        price = quote_cache.get_or_load(
+            (symbol, 'yahoo', 'price'),
+            lambda: _fetch_stock_price(symbol, max_retries),
+            ttl=quote_ttl(symbol)
+        )
+    return price if price is not None else 0.0
+
+BATCH_CHUNK_SIZE = int(os.getenv('QUOTE_BATCH_SIZE', 100))
+
+def _empty_quote() -> Dict:
+    return {'price': None, 'last_close': None, 'change': None, 'change_percent': None, 'as_of': None}
+
+def _quote_from_closes(closes: 'pd.Series', as_of: float) -> Optional[Dict]:
+    closes = closes.dropna()
+    if closes.empty:
+        return None
+    price = float(closes.iloc[-1])
+    if len(closes) < 2:
+        return {'price': price, 'last_close': None, 'change': None, 'change_percent': None, 'as_of': as_of}
+    # Second last entry is the last *closed* price
+    last_close = float(closes.iloc[-2])
+    change = price - last_close
+    return {
+        'price': price,
+        'last_close': last_close,
+        'change': change,
+        'change_percent': (change / last_close) * 100 if last_close else None,
+        'as_of': as_of
+    }
+
+def _download_quotes(symbols: List[str], max_retries: int) -> Dict[str, Dict]:
+    import pandas as pd
+    import yfinance as yf
     for attempt in range(max_retries):
         try:
-            # Add a small delay to avoid rate limiting
-            time.sleep(0.5)
-            stock = yf.Ticker(symbol)
-            # Get the most recent data
-            data = stock.history(period='1d')
-            if data.empty:
-                logger.warning(f"No data found for symbol {symbol}")
-                return 0.0
-            return float(data['Close'].iloc[-1])
+            # Wait for the shared Yahoo Finance request budget
+            yahoo_limiter.acquire()
+            # One download at a time; each one already fetches its tickers in parallel
+            with yahoo_download_lock, upstream_call('yahoo', 'download'):
+                data = yf.download(
+                    tickers=' '.join(symbols),
+                    period='5d',
+                    group_by='ticker',
+                    threads=True,
+                    progress=False
+                )
+            as_of = time.time()
+            quotes = {}
+            for symbol in symbols:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    closes = data[symbol]['Close']
+                else:
+                    closes = data['Close']  # Single ticker downloads are not grouped
+                quote = _quote_from_closes(closes, as_of)
+                if quote is not None:
+                    quotes[symbol] = quote
+            return quotes
         except Exception as e:
-            logger.error(f"Error getting price for {symbol} (attempt {attempt + 1}/{max_retries}): {str(e)}")
+            logger.error(f"Error downloading prices for {len(symbols)} symbols (attempt {attempt + 1}/{max_retries}): {str(e)}")
             if attempt < max_retries - 1:
-                time.sleep(1)  # Wait before retrying
-            else:
-                return 0.0
+                time.sleep(backoff_delay(attempt))  # Wait before retrying
+    return {}
 
-def get_stock_info(symbol: str, max_retries: int = 3) -> Dict:
+def get_stock_prices(symbols: List[str], max_retries: int = 3, chunk_size: int = BATCH_CHUNK_SIZE) -> Dict[str, Dict]:
     """
-    Get detailed information about a stock.
+    Get current price, last close and change for many symbols at once.
+    
+    Symbols missing from the quote cache are fetched in batched downloads of
+    up to chunk_size tickers each, instead of one request per symbol.
     
     Args:
-        symbol (str): The stock symbol to get information for
-        max_retries (int): Maximum number of retry attempts
+        symbols (List[str]): The stock symbols to get quotes for
+        max_retries (int): Maximum number of retry attempts per batch
+        chunk_size (int): Maximum number of symbols per upstream request
         
     Returns:
-        Dict: Dictionary containing stock information
+        Dict[str, Dict]: Quote per symbol with 'price', 'last_close', 'change',
+        'change_percent' and 'as_of' (fetch time as a Unix timestamp); values
+        are None when a quote could not be fetched
     """
+    unique = list(dict.fromkeys(s.upper() for s in symbols))
+    cached = quote_cache.get_many([(symbol, 'yahoo', 'quote') for symbol in unique])
+    quotes = {key[0]: value for key, value in cached.items()}
+    missing = [symbol for symbol in unique if symbol not in quotes]
+
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        fetched = _download_quotes(chunk, max_retries)
+        for symbol, quote in fetched.items():
+            ttl = quote_ttl(symbol)
+            quote_cache.set((symbol, 'yahoo', 'quote'), quote, ttl)
+            quote_cache.set((symbol, 'yahoo', 'price'), quote['price'], ttl)
+            if quote['last_close'] is not None:
+                quote_cache.set((symbol, 'yahoo', 'last_close'), quote['last_close'], _until_boundary(symbol, LAST_CLOSE_TTL))
+        for symbol in chunk:
+            if symbol not in fetched:
+                logger.warning(f"No data found for symbol {symbol}")
+            quotes[symbol] = fetched.get(symbol, _empty_quote())
+    return quotes
+
+def _fetch_stock_info(symbol: str, max_retries: int = 3) -> Optional[Dict]:
+    import yfinance as yf
     for attempt in range(max_retries):
         try:
-            # Add a small delay to avoid rate limiting
-            time.sleep(0.5)
+            # Wait for the shared Yahoo Finance request budget
+            yahoo_limiter.acquire()
             stock = yf.Ticker(symbol)
-            info = stock.info
+            with upstream_call('yahoo', 'info'):
+                info = stock.info
             
             # Extract relevant information
             return {
@@ -87,47 +373,55 @@ def get_stock_info(symbol: str, max_retries: int = 3) -> Dict:
         except Exception as e:
             logger.error(f"Error getting info for {symbol} (attempt {attempt + 1}/{max_retries}): {str(e)}")
             if attempt < max_retries - 1:
-                time.sleep(1)  # Wait before retrying
-            else:
-                return {
-                    'symbol': symbol,
-                    'name': '',
-                    'sector': '',
-                    'industry': '',
-                    'market_cap': 0,
-                    'pe_ratio': 0,
-                    'dividend_yield': 0,
-                    'fifty_two_week_high': 0,
-                    'fifty_two_week_low': 0,
-                    'volume': 0,
-                    'avg_volume': 0
-                }
+                time.sleep(backoff_delay(attempt))  # Wait before retrying
+    return None
+
+# Fundamentals change at most daily; lookups are local reads of this cache
+fundamentals_cache = FundamentalsCache(
+    os.getenv('FUNDAMENTALS_CACHE_FILE', 'fundamentals.db'),
+    load=_fetch_stock_info,
+    ttl=float(os.getenv('FUNDAMENTALS_CACHE_TTL', 86400)),
+    failure_ttl=float(os.getenv('FUNDAMENTALS_FAILURE_TTL', 300))
+)
+
+def get_stock_info(symbol: str) -> Dict:
+    """
+    Get detailed information about a stock.
+    
+    Served from the fundamentals cache; expired entries are returned as-is
+    and refreshed in the background.
+    
+    Args:
+        symbol (str): The stock symbol to get information for
+        
+    Returns:
+        Dict: Dictionary containing stock information
+    """
+    info = fundamentals_cache.get(symbol)
+    if info is not None:
+        return info
+    return {
+        'symbol': symbol,
+        'name': '',
+        'sector': '',
+        'industry': '',
+        'market_cap': 0,
+        'pe_ratio': 0,
+        'dividend_yield': 0,
+        'fifty_two_week_high': 0,
+        'fifty_two_week_low': 0,
+        'volume': 0,
+        'avg_volume': 0
+    }
 
 def get_asx_stocks() -> List[Dict]:
     """
-    Get a list of US stocks with their basic information.
+    Get the ASX-listed stocks with their basic information.
     
     Returns:
-        List[Dict]: List of dictionaries containing stock information
+        List[Dict]: List of dictionaries with 'symbol' (Yahoo Finance ticker) and 'name'
     """
-    # Sample list of US stocks
-    sample_stocks = [
-        {"symbol": "AAPL", "name": "Apple Inc."},
-        {"symbol": "MSFT", "name": "Microsoft Corporation"},
-        {"symbol": "GOOGL", "name": "Alphabet Inc."},
-        {"symbol": "AMZN", "name": "Amazon.com Inc."},
-        {"symbol": "TSLA", "name": "Tesla Inc."},
-        {"symbol": "FB", "name": "Meta Platforms Inc."},
-        {"symbol": "NFLX", "name": "Netflix Inc."},
-        {"symbol": "NVDA", "name": "NVIDIA Corporation"},
-        {"symbol": "JPM", "name": "JPMorgan Chase & Co."},
-        {"symbol": "V", "name": "Visa Inc."},
-        {"symbol": "WMT", "name": "Walmart Inc."},
-        {"symbol": "DIS", "name": "The Walt Disney Company"},
-        {"symbol": "PG", "name": "Procter & Gamble Co."},
-        {"symbol": "KO", "name": "The Coca-Cola Company"}
-    ]
-    return sample_stocks
+    return symbol_universe.listings('asx')
 
 def is_asx_open() -> bool:
     """
@@ -137,19 +431,7 @@ def is_asx_open() -> bool:
         bool: True if the market is open, False otherwise
     """
     try:
-        # Set timezone to Sydney
-        sydney_tz = pytz.timezone('Australia/Sydney')
-        current_time = datetime.now(sydney_tz)
-        
-        # Check if it's a weekday
-        if current_time.weekday() >= 5:  # 5 is Saturday, 6 is Sunday
-            return False
-            
-        # Market hours: 10:00 AM - 4:00 PM Sydney time
-        market_open = current_time.replace(hour=10, minute=0, second=0, microsecond=0)
-        market_close = current_time.replace(hour=16, minute=0, second=0, microsecond=0)
-        
-        return market_open <= current_time <= market_close
+        return market_calendar.is_open('asx')
     except Exception as e:
         logger.error(f"Error checking ASX market status: {str(e)}")
         return False
@@ -0,0 +1,417 @@
+import itertools
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from price_utils import fetch_yahoo_price, quote_cache, quote_ttl, yahoo_limiter
+from rate_limiter import get_limiter
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    Stops calls to a provider after repeated failures or slow answers.
+
+    Closed: calls go through. After failure_threshold consecutive failures
+    the breaker opens and calls are refused for reset_timeout seconds. It
+    then lets a single trial call through; success closes it, failure opens
+    it again.
+
+    Calls are tracked from begin() to end(). A call still running past
+    latency_threshold, or past the deadline its caller gave up at, counts
+    as a failure as soon as that is noticed (on the next allow() or stats()),
+    not only when it finally returns; its eventual end() is then ignored.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, latency_threshold: float = 2.0, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._calls: Dict[int, _Call] = {}
+        self._call_ids = itertools.count()
+        self.successes = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Check whether a call may go ahead; in half-open state only one may."""
+        with self._lock:
+            self._expire_overdue()
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = 'half_open'
+                return True
+            if self.state == 'half_open':
+                # A trial call is already in flight
+                self.rejected += 1
+                return False
+            return True
+
+    def begin(self, deadline: Optional[float] = None) -> int:
+        """
+        Start timing an allowed call.
+
+        Args:
+            deadline (float): time.monotonic() at which the caller stops
+                waiting for the answer, if sooner than latency_threshold
+
+        Returns:
+            int: Call id to pass to pause, resume and end
+        """
+        with self._lock:
+            call = next(self._call_ids)
+            self._calls[call] = _Call(time.monotonic(), deadline)
+            return call
+
+    def pause(self, call: int) -> None:
+        """Stop the clock of a call, e.g. while it waits for a rate limiter."""
+        with self._lock:
+            tracked = self._calls.get(call)
+            if tracked is not None and tracked.paused_at is None:
+                tracked.paused_at = time.monotonic()
+
+    def resume(self, call: int) -> None:
+        with self._lock:
+            tracked = self._calls.get(call)
+            if tracked is not None and tracked.paused_at is not None:
+                tracked.start += time.monotonic() - tracked.paused_at
+                tracked.paused_at = None
+
+    def end(self, call: int, failed: bool = False) -> None:
+        """Record the outcome of a call, unless it was already counted as overdue."""
+        with self._lock:
+            tracked = self._calls.pop(call, None)
+            if tracked is None:
+                return
+            if failed:
+                self._record_failure()
+            elif time.monotonic() - tracked.start > self.latency_threshold:
+                self.slow_calls += 1
+                self._record_failure()
+            else:
+                self.successes += 1
+                self._failures = 0
+                self.state = 'closed'
+
+    def expire_overdue(self) -> None:
+        """Count calls past their latency threshold or deadline as failures now."""
+        with self._lock:
+            self._expire_overdue()
+
+    def _expire_overdue(self) -> None:
+        # Caller holds self._lock
+        now = time.monotonic()
+        overdue = [
+            call for call, tracked in self._calls.items()
+            if tracked.paused_at is None and (
+                now - tracked.start > self.latency_threshold
+                or (tracked.deadline is not None and now >= tracked.deadline)
+            )
+        ]
+        for call in overdue:
+            del self._calls[call]
+            self.slow_calls += 1
+            self._record_failure()
+
+    def _record_failure(self) -> None:
+        # Caller holds self._lock
+        self.failures += 1
+        self._failures += 1
+        if self.state == 'half_open' or self._failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.opened += 1
+                logger.warning(f"Circuit breaker for {self.name} opened after {self._failures} failures")
+            self.state = 'open'
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._expire_overdue()
+            return {
+                'state': self.state,
+                'open': self.state == 'open',
+                'consecutive_failures': self._failures,
+                'successes': self.successes,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+                'rejected': self.rejected,
+                'opened': self.opened,
+                'in_flight': len(self._calls)
+            }
+
+class _Call:
+    __slots__ = ('start', 'deadline', 'paused_at')
+
+    def __init__(self, start: float, deadline: Optional[float]):
+        self.start = start
+        self.deadline = deadline
+        self.paused_at = None
+
+class QuoteProvider(ABC):
+    """
+    A source of latest prices guarded by its own circuit breaker.
+
+    Subclasses implement fetch_price (and fetch_prices when the upstream has
+    a batch call) and let errors propagate; try_price and try_prices turn
+    them into missing prices and feed the breaker. Rate limiter waits go
+    through wait_for so they don't count towards the call's latency.
+    """
+
+    name = 'provider'
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None):
+        self.breaker = breaker or CircuitBreaker(self.name)
+        self._local = threading.local()
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, symbol: str) -> bool:
+        """Whether the provider lists the symbol; others are skipped without a call."""
+        return True
+
+    @abstractmethod
+    def fetch_price(self, symbol: str) -> Optional[float]:
+        ...
+
+    def fetch_prices(self, symbols: List[str]) -> Dict[str, float]:
+        prices = {}
+        for symbol in symbols:
+            price = self.fetch_price(symbol)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    def wait_for(self, limiter) -> None:
+        """Wait for a rate limiter with the current call's clock stopped."""
+        call = getattr(self._local, 'call', None)
+        if call is None:
+            limiter.acquire()
+            return
+        self.breaker.pause(call)
+        try:
+            limiter.acquire()
+        finally:
+            self.breaker.resume(call)
+
+    def _guarded(self, fetch: Callable, arg, deadline: Optional[float]):
+        if not self.available() or not self.breaker.allow():
+            return None
+        call = self._local.call = self.breaker.begin(deadline)
+        try:
+            result = fetch(arg)
+        except Exception as e:
+            self.breaker.end(call, failed=True)
+            logger.warning(f"{self.name} price fetch failed: {e}")
+            return None
+        finally:
+            self._local.call = None
+        self.breaker.end(call)
+        return result
+
+    def try_price(self, symbol: str, deadline: Optional[float] = None) -> Optional[float]:
+        """
+        Latest price, or None if unavailable, refused by the breaker or failed.
+
+        A call still running at deadline (a time.monotonic() value) counts
+        as a breaker failure.
+        """
+        if not self.supports(symbol):
+            return None
+        return self._guarded(self.fetch_price, symbol, deadline) or None
+
+    def try_prices(self, symbols: List[str], deadline: Optional[float] = None) -> Dict[str, float]:
+        """Latest prices for the symbols this provider could price."""
+        symbols = [symbol for symbol in symbols if self.supports(symbol)]
+        if not symbols:
+            return {}
+        return self._guarded(self.fetch_prices, symbols, deadline) or {}
+
+    def health(self) -> Dict:
+        return dict(self.breaker.stats(), available=self.available())
+
+class AlpacaProvider(QuoteProvider):
+    """
+    Latest trades from the shared Alpaca connection, when it is up.
+
+    Alpaca only lists US symbols, which are used as they are; ASX symbols
+    (with the Yahoo .AX suffix) are left to the other providers.
+    """
+
+    name = 'alpaca'
+
+    def __init__(self, get_trader: Callable[[], Optional[object]], breaker: Optional[CircuitBreaker] = None):
+        super().__init__(breaker)
+        self.get_trader = get_trader
+
+    def available(self) -> bool:
+        trader = self.get_trader()
+        return bool(trader and trader.connected)
+
+    def supports(self, symbol: str) -> bool:
+        return not symbol.upper().endswith('.AX')
+
+    def fetch_price(self, symbol: str) -> Optional[float]:
+        self.wait_for(get_limiter('alpaca'))
+        trade = self.get_trader().api.get_latest_trade(symbol)
+        return float(trade.price)
+
+    def fetch_prices(self, symbols: List[str]) -> Dict[str, float]:
+        self.wait_for(get_limiter('alpaca'))
+        trades = self.get_trader().api.get_latest_trades(symbols)
+        return {symbol: float(trades[symbol].price) for symbol in symbols if symbol in trades}
+
+class YahooProvider(QuoteProvider):
+    """Yahoo Finance prices, shared with get_stock_price through the quote cache."""
+
+    name = 'yahoo'
+
+    def fetch_price(self, symbol: str) -> Optional[float]:
+        return quote_cache.get_or_load((symbol, 'yahoo', 'price'), lambda: self._fetch(symbol), ttl=quote_ttl(symbol))
+
+    def _fetch(self, symbol: str) -> Optional[float]:
+        self.wait_for(yahoo_limiter)
+        return fetch_yahoo_price(symbol)
+
+class HedgedQuoteFetcher:
+    """
+    Ask providers in order of preference, hedging slow answers.
+
+    The first provider is asked at once. If it hasn't answered within
+    hedge_delay, or answers without a price, the next one is asked too, and
+    so on; the first price to arrive wins. Providers whose breaker is open
+    answer immediately with nothing, so a failing provider costs no waiting.
+
+    Each provider has its own pool of `workers` threads, so calls hanging on
+    one provider can't hold up the others. A provider whose threads are all
+    busy is skipped rather than queued behind them. Calls still running
+    when a winner arrives finish in the background; if they pass the
+    timeout, their provider's breaker counts them as failures from then on.
+    """
+
+    def __init__(self, providers: List[QuoteProvider], hedge_delay: float = 0.3, timeout: float = 5.0, workers: int = 8):
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.workers = workers
+        self._executors = {
+            provider.name: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"quotes-{provider.name}")
+            for provider in providers
+        }
+        self._busy: Dict[str, int] = {provider.name: 0 for provider in providers}
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.saturated = 0
+        self.wins: Dict[str, int] = {provider.name: 0 for provider in providers}
+
+    def _submit(self, provider: QuoteProvider, fetch: Callable, arg, deadline: float):
+        """Start a lookup on the provider's own threads, or return None if they are all busy."""
+        with self._lock:
+            if self._busy[provider.name] >= self.workers:
+                self.saturated += 1
+                return None
+            self._busy[provider.name] += 1
+        future = self._executors[provider.name].submit(fetch, arg, deadline)
+        future.add_done_callback(lambda _: self._release(provider.name))
+        return future
+
+    def _release(self, name: str) -> None:
+        with self._lock:
+            self._busy[name] -= 1
+
+    def get_price(self, symbol: str) -> Optional[float]:
+        """
+        Get the latest price for a symbol from the fastest healthy provider.
+
+        Returns:
+            Optional[float]: The price, or None if no provider answered in time
+        """
+        deadline = time.monotonic() + self.timeout
+        remaining = list(self.providers)
+        pending = {}
+
+        def launch() -> None:
+            # Skip providers with no free thread; a queued call would only wait
+            while remaining:
+                provider = remaining.pop(0)
+                future = self._submit(provider, provider.try_price, symbol, deadline)
+                if future is not None:
+                    pending[future] = provider
+                    return
+
+        launch()
+        while pending:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            done, _ = wait(pending, timeout=min(self.hedge_delay, left) if remaining else left, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                price = future.result()
+                if price is not None:
+                    with self._lock:
+                        self.wins[provider.name] += 1
+                    return price
+            if remaining:
+                if not done:
+                    # Hedge: the providers asked so far are slower than the budget
+                    with self._lock:
+                        self.hedged += 1
+                # Otherwise every answer so far came back empty; move on at once
+                launch()
+        # Calls still running have missed the deadline; count them against their breakers now
+        for provider in set(pending.values()):
+            provider.breaker.expire_overdue()
+        logger.warning(f"No provider returned a price for {symbol}")
+        return None
+
+    def preferred_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        Get batched prices from the first provider, waiting at most hedge_delay.
+
+        For callers that already hold prices from a later provider: whatever
+        the first provider hasn't answered by then is left to them. A call
+        still running finishes in the background and counts against the
+        provider's breaker.
+
+        Returns:
+            Dict[str, float]: Prices the first provider returned in time
+        """
+        provider = self.providers[0]
+        deadline = time.monotonic() + self.hedge_delay
+        future = self._submit(provider, provider.try_prices, symbols, deadline)
+        if future is None:
+            return {}
+        done, _ = wait([future], timeout=self.hedge_delay)
+        if not done:
+            with self._lock:
+                self.hedged += 1
+            provider.breaker.expire_overdue()
+            return {}
+        prices = future.result()
+        if prices:
+            with self._lock:
+                self.wins[provider.name] += 1
+        return prices
+
+    def health(self) -> Dict[str, Dict]:
+        """Breaker state, availability and win count per provider."""
+        with self._lock:
+            wins = dict(self.wins)
+        return {provider.name: dict(provider.health(), wins=wins[provider.name]) for provider in self.providers}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'hedged': self.hedged, 'saturated': self.saturated, 'requests': sum(self.wins.values())}
@@ -0,0 +1,122 @@
+import os
+import random
+import threading
+import time
+from typing import Dict
+
+# Default budgets per upstream provider: (requests per second, burst size)
+DEFAULT_LIMITS = {
+    'yahoo': (5.0, 10),
+    'alpaca': (3.0, 10)
+}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every caller of one upstream provider.
+
+    Callers only block when the bucket is empty, i.e. when the configured
+    request budget has actually been used up.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Take tokens from the bucket, sleeping until enough are available.
+
+        Returns:
+            float: Number of seconds the caller waited
+        """
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.acquired += 1
+                    if waited:
+                        self.throttled += 1
+                        self.total_wait += waited
+                        self.max_wait = max(self.max_wait, waited)
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'acquired': self.acquired,
+                'throttled': self.throttled,
+                'total_wait': round(self.total_wait, 6),
+                'max_wait': round(self.max_wait, 6),
+                'avg_wait': round(self.total_wait / self.acquired, 6) if self.acquired else 0.0
+            }
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """
+    Get a jittered exponential backoff delay for the given retry attempt.
+
+    Uses "full jitter": a random delay between 0 and base * 2 ** attempt,
+    capped at cap seconds.
+    """
+    base = float(os.getenv('RETRY_BACKOFF_BASE', 0.5)) if base is None else base
+    cap = float(os.getenv('RETRY_BACKOFF_CAP', 8)) if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name: str) -> TokenBucket:
+    """
+    Get the shared limiter for an upstream provider.
+
+    The budget is read from <NAME>_RATE_LIMIT (requests per second) and
+    <NAME>_RATE_BURST the first time a provider's limiter is requested.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            rate, burst = DEFAULT_LIMITS.get(name, (5.0, 10))
+            limiter = TokenBucket(
+                name,
+                rate=float(os.getenv(f'{name.upper()}_RATE_LIMIT', rate)),
+                capacity=int(os.getenv(f'{name.upper()}_RATE_BURST', burst))
+            )
+            _limiters[name] = limiter
+        return limiter
+
+_locks: Dict[str, threading.Lock] = {}
+
+def get_upstream_lock(name: str) -> threading.Lock:
+    """
+    Get the shared lock for an upstream call that must not run concurrently.
+
+    Some client calls keep their state in module globals, so overlapping
+    calls from different threads corrupt each other's results.
+    """
+    with _limiters_lock:
+        return _locks.setdefault(name, threading.Lock())
+
+def limiter_stats() -> Dict[str, Dict]:
+    """Get wait statistics for every limiter created so far."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
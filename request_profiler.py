@@ -0,0 +1,134 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ProfileRecord:
+    """Stack samples of one request plus its route and timing metadata."""
+
+    def __init__(self, method: str, path: str, route: str, status: int, duration: float, started_at: float, samples: Counter, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route = route
+        self.status = status
+        self.duration = duration
+        self.started_at = started_at
+        self.samples = samples
+        self.interval = interval
+
+    def summary(self) -> Dict:
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'route': self.route,
+            'status': self.status,
+            'duration_ms': round(self.duration * 1000, 3),
+            'samples': sum(self.samples.values()),
+            'interval_ms': round(self.interval * 1000, 3),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started_at))
+        }
+
+    def collapsed(self) -> str:
+        """
+        Render the samples in the collapsed-stack format used by flamegraph.pl
+        and speedscope: one "root;caller;callee count" line per distinct stack.
+        """
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+class RequestProfiler:
+    """
+    Sampling profiler for individual requests.
+
+    A single background thread samples the stacks of every thread currently
+    running a profiled request, so profiling costs nothing when no request
+    is being profiled and one thread however many are. Only the request's
+    own thread is sampled; time spent in worker pools shows up as the
+    request thread waiting on their futures.
+
+    The most recent profiles are kept in memory so the slowest can be listed
+    and downloaded.
+    """
+
+    def __init__(self, interval: float = 0.005, sample_rate: float = 0.0, history: int = 100):
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self._records = deque(maxlen=history)
+        self._active: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, thread_id: Optional[int] = None) -> None:
+        """Start sampling a thread (the calling thread by default)."""
+        thread_id = thread_id or threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id: Optional[int] = None) -> Counter:
+        """Stop sampling a thread and get its collapsed stack counts."""
+        with self._lock:
+            return self._active.pop(thread_id or threading.get_ident(), Counter())
+
+    def record(self, method: str, path: str, route: str, status: int, duration: float, started_at: float, samples: Counter) -> ProfileRecord:
+        record = ProfileRecord(method, path, route, status, duration, started_at, samples, self.interval)
+        with self._lock:
+            self._records.append(record)
+        logger.info(f"Profiled {method} {path}: {duration * 1000:.1f} ms, {sum(samples.values())} samples (id {record.id})")
+        return record
+
+    def slowest(self, limit: int = 20) -> List[ProfileRecord]:
+        with self._lock:
+            records = list(self._records)
+        return sorted(records, key=lambda record: record.duration, reverse=True)[:limit]
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        with self._lock:
+            return next((record for record in self._records if record.id == profile_id), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    # Exit when idle; the next start() spawns a new sampler
+                    self._thread = None
+                    return
+                thread_ids = list(self._active)
+            frames = sys._current_frames()
+            stacks = {thread_id: _collapse(frames[thread_id]) for thread_id in thread_ids if thread_id in frames}
+            with self._lock:
+                for thread_id, stack in stacks.items():
+                    samples = self._active.get(thread_id)
+                    if samples is not None:
+                        samples[stack] += 1
+            time.sleep(self.interval)
+
+request_profiler = RequestProfiler(
+    interval=float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000,
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+    history=int(os.getenv('PROFILE_HISTORY', 100))
+)
@@ -0,0 +1,259 @@
+import argparse
+import csv
+import io
+import logging
+import os
+import re
+import threading
+import urllib.request
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SYMBOLS_FILE = os.getenv(
+    'SYMBOLS_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv')
+)
+
+# Official listing files used by --refresh
+NASDAQ_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt'
+OTHER_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt'
+ASX_LISTED_URL = 'https://www.asx.com.au/asx/research/ASXListedCompanies.csv'
+# otherlisted.txt exchange codes traded here as NYSE
+NYSE_EXCHANGES = {'N', 'A', 'P'}
+# Fewer listings than this means only the bundled starter set is loaded
+FULL_UNIVERSE_MIN = int(os.getenv('SYMBOLS_FULL_UNIVERSE_MIN', 1000))
+# Yahoo Finance suffix per market for symbols that carry one
+MARKET_SUFFIXES = {'asx': '.AX'}
+
+Listing = namedtuple('Listing', ['symbol', 'name', 'market'])
+
+_WORD = re.compile(r'[A-Z0-9]+')
+# Highest-sorting string, used as the upper bound of a prefix range
+_MAX_CHAR = '\uffff'
+
+def _normalize(text: str) -> str:
+    return ' '.join(_WORD.findall(text.upper()))
+
+def _deletions(key: str) -> List[str]:
+    return [key[:i] + key[i + 1:] for i in range(len(key))]
+
+class _PrefixIndex:
+    """Sorted keys with a parallel array of listing positions."""
+
+    def __init__(self, pairs: Iterable):
+        pairs = sorted(set(pairs))
+        self.keys = [key for key, _ in pairs]
+        self.refs = array('I', (ref for _, ref in pairs))
+
+    def scan(self, prefix: str):
+        """Yield listing positions whose key starts with prefix, in key order."""
+        i = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + _MAX_CHAR, i)
+        for j in range(i, end):
+            yield self.refs[j]
+
+class SymbolIndex:
+    """
+    Prefix and typo-tolerant search over a list of listings.
+
+    Three sorted key arrays are built once: ticker symbols, full company
+    names, and every word position within a name (so "america" finds "Bank
+    of America"). A query is a bisect into each array followed by a short
+    scan, so cost depends on the number of results, not the universe size.
+    A deletion index over symbols catches one-character typos.
+    """
+
+    def __init__(self, listings: List[Listing]):
+        self.listings = listings
+        self._symbols = _PrefixIndex((l.symbol.upper(), i) for i, l in enumerate(listings))
+        names = [_normalize(l.name) for l in listings]
+        self._names = _PrefixIndex((name, i) for i, name in enumerate(names) if name)
+        self._words = _PrefixIndex(
+            (name[space.end():], i)
+            for i, name in enumerate(names)
+            for space in re.finditer(' ', name)
+        )
+        self._typos: Dict[str, array] = {}
+        for i, listing in enumerate(listings):
+            code = listing.symbol.upper().split('.')[0]
+            for key in [code] + _deletions(code):
+                self._typos.setdefault(key, array('I')).append(i)
+
+    def __len__(self) -> int:
+        return len(self.listings)
+
+    def search(self, query: str, limit: int = 10) -> List[Listing]:
+        """
+        Find listings matching a query, best matches first.
+
+        Symbol prefixes rank first (an exact symbol always leads), then
+        company name prefixes, then matches on a later word of the name. Only
+        when nothing matches are symbols one typo away returned instead.
+
+        Args:
+            query (str): Symbol or company name fragment
+            limit (int): Maximum number of results
+
+        Returns:
+            List[Listing]: Matching listings
+        """
+        key = _normalize(query)
+        if not key or limit <= 0:
+            return []
+        seen = set()
+        results = []
+
+        def take(refs) -> bool:
+            for ref in refs:
+                if ref not in seen:
+                    seen.add(ref)
+                    results.append(self.listings[ref])
+                    if len(results) >= limit:
+                        return True
+            return False
+
+        symbol_key = query.strip().upper()
+        if take(self._symbols.scan(symbol_key)) or take(self._names.scan(key)) or take(self._words.scan(key)):
+            return results
+        if not results and len(symbol_key) >= 2:
+            code = symbol_key.split('.')[0]
+            for candidate in [code] + _deletions(code):
+                if take(self._typos.get(candidate, ())):
+                    break
+        return results
+
+class SymbolUniverse:
+    """
+    Tradable symbols for every supported market, loaded from a listing file.
+
+    The file is a CSV with symbol, name and market columns, where symbols use
+    the Yahoo Finance form (ASX tickers carry the .AX suffix). Indexes are
+    built once, on load(), for all markets together and for each market.
+    """
+
+    def __init__(self, path: str = SYMBOLS_FILE):
+        self.path = path
+        self._indexes: Optional[Dict[str, SymbolIndex]] = None
+        self._by_symbol: Dict[str, Listing] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> 'SymbolUniverse':
+        """Read the listing file and build the indexes, if not done already."""
+        if self._indexes is not None:
+            return self
+        with self._lock:
+            if self._indexes is None:
+                try:
+                    with open(self.path, newline='', encoding='utf-8') as f:
+                        listings = [
+                            Listing(row['symbol'].strip().upper(), row['name'].strip(), row['market'].strip().lower())
+                            for row in csv.DictReader(f) if row.get('symbol')
+                        ]
+                except Exception as e:
+                    logger.error(f"Error loading symbol universe from {self.path}: {str(e)}")
+                    listings = []
+                by_market: Dict[str, List[Listing]] = {}
+                for listing in listings:
+                    by_market.setdefault(listing.market, []).append(listing)
+                indexes = {market: SymbolIndex(items) for market, items in by_market.items()}
+                indexes['all'] = SymbolIndex(listings)
+                self._by_symbol = {listing.symbol: listing for listing in listings}
+                self._indexes = indexes
+                logger.info(f"Loaded {len(listings)} symbols across {len(by_market)} markets")
+        return self
+
+    def __len__(self) -> int:
+        return len(self.load()._by_symbol)
+
+    def search(self, query: str, market: Optional[str] = None, limit: int = 10) -> List[Listing]:
+        """Search one market (or all of them when market is None)."""
+        index = self.load()._indexes.get((market or 'all').lower())
+        return index.search(query, limit) if index else []
+
+    def get(self, symbol: str) -> Optional[Listing]:
+        return self.load()._by_symbol.get(symbol.strip().upper())
+
+    def is_complete(self) -> bool:
+        """Whether the full exchange listings are loaded rather than the starter set."""
+        return len(self) >= FULL_UNIVERSE_MIN
+
+    def resolve(self, symbol: str, market: Optional[str] = None) -> str:
+        """
+        Get the Yahoo Finance form of a symbol typed for a market.
+
+        A bare code typed for a market whose symbols carry a suffix (BHP on
+        the ASX) gets that suffix, unless the bare code is itself a known
+        listing and the suffixed one is not (AAPL stays AAPL).
+        """
+        symbol = symbol.strip().upper()
+        suffix = MARKET_SUFFIXES.get((market or '').lower())
+        if not suffix or '.' in symbol or not symbol:
+            return symbol
+        suffixed = f"{symbol}{suffix}"
+        if self.get(symbol) is not None and self.get(suffixed) is None:
+            return symbol
+        return suffixed
+
+    def listings(self, market: Optional[str] = None) -> List[Dict]:
+        """All listings of a market as symbol/name dicts, in file order."""
+        index = self.load()._indexes.get((market or 'all').lower())
+        return [{'symbol': l.symbol, 'name': l.name} for l in index.listings] if index else []
+
+    def stats(self) -> Dict:
+        indexes = self.load()._indexes
+        return {market: len(index) for market, index in indexes.items()}
+
+symbol_universe = SymbolUniverse()
+
+def _download(url: str) -> str:
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read().decode('utf-8', errors='replace')
+
+def fetch_listings() -> List[Listing]:
+    """Download the current NASDAQ, NYSE and ASX listings."""
+    listings = []
+    for row in csv.DictReader(io.StringIO(_download(NASDAQ_LISTED_URL)), delimiter='|'):
+        if row.get('Test Issue') == 'N' and row.get('Symbol'):
+            listings.append(Listing(row['Symbol'].replace('.', '-'), row['Security Name'], 'nasdaq'))
+    for row in csv.DictReader(io.StringIO(_download(OTHER_LISTED_URL)), delimiter='|'):
+        if row.get('Test Issue') == 'N' and row.get('Exchange') in NYSE_EXCHANGES:
+            listings.append(Listing(row['ACT Symbol'].replace('.', '-'), row['Security Name'], 'nyse'))
+
+    # The ASX file starts with a title line before the CSV header
+    lines = _download(ASX_LISTED_URL).splitlines()
+    start = next(i for i, line in enumerate(lines) if 'ASX code' in line)
+    for row in csv.DictReader(lines[start:]):
+        if row.get('ASX code'):
+            listings.append(Listing(f"{row['ASX code'].strip()}.AX", row['Company name'].strip(), 'asx'))
+    return listings
+
+def write_listings(listings: List[Listing], path: str = SYMBOLS_FILE) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(Listing._fields)
+        writer.writerows(listings)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Search or refresh the bundled symbol universe.')
+    parser.add_argument('query', nargs='?', help='Symbol or company name to search for')
+    parser.add_argument('--market', help='Restrict the search to asx, nyse or nasdaq')
+    parser.add_argument('--refresh', action='store_true', help='Download the full exchange listings into the symbol file')
+    args = parser.parse_args()
+
+    if args.refresh:
+        listings = fetch_listings()
+        write_listings(listings)
+        print(f"Wrote {len(listings)} listings to {SYMBOLS_FILE}")
+    if args.query:
+        for listing in symbol_universe.search(args.query, args.market):
+            print(f"{listing.symbol:<12} {listing.market:<7} {listing.name}")
+
+if __name__ == '__main__':
+    main()
@@ -4,21 +4,14 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Union
 import json
 from dotenv import load_dotenv
-import alpaca_trade_api as tradeapi
 from price_utils import get_stock_price, get_stock_info
+from metrics import InstrumentedClient
+from alpaca_trader import alpaca_base_url, with_request_timeout
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.getenv('LOG_FILE', 'click_trader_log.txt')),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 class TradingEngine:
@@ -30,12 +23,14 @@ class TradingEngine:
     def initialize_apis(self):
         """Initialize trading platform APIs."""
         try:
+            # Imported here: the Alpaca SDK pulls in pandas and aiohttp
+            import alpaca_trade_api as tradeapi
             # Initialize Alpaca
-            self.alpaca = tradeapi.REST(
+            self.alpaca = InstrumentedClient(with_request_timeout(tradeapi.REST(
                 os.getenv('ALPACA_API_KEY'),
                 os.getenv('ALPACA_API_SECRET'),
-                os.getenv('ALPACA_BASE_URL', 'https://paper-api.alpaca.markets')
-            )
+                alpaca_base_url()
+            )), 'alpaca')
             logger.info("Successfully connected to Alpaca")
         except Exception as e:
             logger.error(f"Error initializing APIs: {str(e)}")
@@ -97,7 +92,7 @@ class TradingEngine:
             logger.error(f"Error getting positions: {str(e)}")
             return []
             
-    def place_order(self, symbol: str, qty: int, side: str, type: str = 'market', time_in_force: str = 'day') -> Dict:
+    def place_order(self, symbol: str, qty: int, side: str, type: str = 'market', time_in_force: str = 'day', client_order_id: Optional[str] = None) -> Dict:
         """Place an order on Alpaca."""
         try:
             if self.alpaca:
@@ -106,7 +101,8 @@ class TradingEngine:
                     qty=qty,
                     side=side,
                     type=type,
-                    time_in_force=time_in_force
+                    time_in_force=time_in_force,
+                    client_order_id=client_order_id
                 )
                 return {
                     'id': order.id,
@@ -136,8 +132,25 @@ class TradingEngine:
                 }
             return {}
         except Exception as e:
+            existing = self.find_order(client_order_id) if client_order_id else None
+            if existing is not None:
+                # A previous attempt already reached the broker
+                logger.info(f"Order {client_order_id} was already accepted")
+                return {
+                    'id': existing.id,
+                    'client_order_id': existing.client_order_id,
+                    'symbol': existing.symbol,
+                    'status': existing.status
+                }
             logger.error(f"Error placing order: {str(e)}")
             return {}
+
+    def find_order(self, client_order_id: str):
+        """Get the broker's order with this client order ID, or None if it was never accepted."""
+        try:
+            return self.alpaca.get_order_by_client_order_id(client_order_id) if self.alpaca else None
+        except Exception:
+            return None
             
     def get_orders(self, status: str = 'open') -> List[Dict]:
         """Get orders from Alpaca."""
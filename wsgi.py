@@ -1,6 +1,9 @@
 import os
-from app import app
+from app import create_app
+
+# Start the background services at worker boot instead of on the first request
+app = create_app()
 
 # This is for PythonAnywhere
 if __name__ == "__main__":
-    app.run() 
\ No newline at end of file
+    app.run() 